@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+ERROR_PYTHON_VERSION = 1
+ERROR_MODULES_MISSING = 2
+
+import sys
+
+if sys.version_info < (3, 6):
+    print('Use python >= 3.6', file=sys.stderr)
+    sys.exit(ERROR_PYTHON_VERSION)
+
+import argparse
+import time
+
+try:
+    from fillomino_logic import (FieldState, BitboardFieldState,
+                                 generate_many, solve_with_backend)
+except Exception as e:
+    print('Game modules not found: "{}"'.format(e), file=sys.stderr)
+    sys.exit(ERROR_MODULES_MISSING)
+
+
+__author__ = 'Dyuzheva Maria'
+__email__ = 'mdyuzheva@gmail.com'
+
+STATE_CLASSES = (('dict', FieldState), ('bitboard', BitboardFieldState))
+SOLVE_BACKENDS = (('dict', 'large'), ('bitboard', 'bitboard'))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        usage='%(prog)s [OPTIONS]',
+        description='Fillomino field state benchmark',
+        epilog='Author: {} <{}>'.format(__author__, __email__))
+
+    parser.add_argument(
+        '-s', '--size', type=int, nargs='+', default=[8, 15, 25],
+        metavar='SIZE', help='field sizes (default: 8 15 25)')
+    parser.add_argument(
+        '-e', '--empty', type=int, default=30,
+        metavar='PERCENT', help='percent of empty cells (default: 30)')
+    parser.add_argument(
+        '-n', '--count', type=int, default=3,
+        metavar='COUNT', help='puzzles per size for solving (default: 3)')
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=5,
+        metavar='COUNT', help='take the best of COUNT runs (default: 5)')
+    parser.add_argument(
+        '-b', '--budget', type=int, default=1000,
+        metavar='NODES', help='stop each solve after NODES search nodes '
+                              '(default: 1000)')
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        metavar='SEED', help='random seed (default: 0)')
+    parser.add_argument(
+        '--no-solve', action="store_true", default=False,
+        help='benchmark state operations only')
+
+    return parser.parse_args()
+
+
+def best_time(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def involved(state):
+    for cell in state.field.get_all_cells():
+        state.get_involved(cell)
+
+
+def neighbours_differ(state):
+    for cell in state.field.get_all_cells():
+        state.neighbours_differ(cell, (), state.get_state(cell))
+
+
+def expansion(state):
+    involved_cells = set()
+    for cell in state.field.get_all_cells():
+        value = state.get_state(cell)
+        if value and cell not in involved_cells:
+            group = state.get_involved(cell)
+            involved_cells.update(group)
+            if len(group) < value:
+                state.get_expansion(group, value)
+
+
+OPERATIONS = (('get_involved', involved),
+              ('neighbours_differ', neighbours_differ),
+              ('get_expansion', expansion))
+
+
+def benchmark_operations(puzzles, repeat):
+    print('{:>18}{:>6}{:>10}{:>10}'.format('operation', 'size', 'dict',
+                                           'bitboard'))
+    for name, operation in OPERATIONS:
+        for size, strings in puzzles:
+            states = [[state_class.from_string_to_state(string)
+                       for string in strings]
+                      for _, state_class in STATE_CLASSES]
+            times = [best_time(lambda: [operation(s) for s in state_list],
+                               repeat)
+                     for state_list in states]
+            print('{:>18}{:>6}{:>10.4f}{:>10.4f}'.format(name, size, *times))
+
+
+def benchmark_solves(puzzles, repeat, budget=None):
+    print('{:>18}{:>6}{:>10}{:>10}{:>14}'.format('solve', 'size', 'dict',
+                                                 'bitboard', 'nodes'))
+    for size, strings in puzzles:
+        times = []
+        nodes = []
+        for _, backend in SOLVE_BACKENDS:
+            results = []
+            times.append(best_time(lambda: results.append(
+                [solve_with_backend(backend, string, budget=budget)
+                 for string in strings]),
+                repeat))
+            nodes.append(sum(r.nodes for r in results[-1]))
+        print('{:>18}{:>6}{:>10.4f}{:>10.4f}{:>14}'.format(
+            'large', size, *times, '{}/{}'.format(*nodes)))
+
+
+def main():
+    args = parse_args()
+
+    puzzles = []
+    for size in args.size:
+        generators = generate_many(args.count, size, args.empty,
+                                   big=size > 7, seed=args.seed)
+        puzzles.append((size, [str(generator.game_field)
+                               for generator in generators]))
+
+    benchmark_operations(puzzles, args.repeat)
+    if not args.no_solve:
+        benchmark_solves(puzzles, args.repeat, args.budget)
+
+
+if __name__ == '__main__':
+    main()
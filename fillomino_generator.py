@@ -4,6 +4,7 @@ ERROR_PYTHON_VERSION = 1
 ERROR_MODULES_MISSING = 2
 ERROR_GENERATING_PUZZLE = 3
 ERROR_WRITING_TO_FILE = 4
+ERROR_READING_FROM_FILE = 5
 
 import sys
 import os
@@ -18,7 +19,10 @@ if sys.platform.startswith('win32'):
 import argparse
 
 try:
-    from fillomino_logic import PuzzleGenerator
+    from fillomino_logic import (PuzzleGenerator, LargePuzzleGenerator,
+                                 MemoryProfiler, memory_phase, generate_many,
+                                 PuzzleStore, GeneratorStats, is_unique,
+                                 UNIQUENESS_BUDGET)
 except Exception as e:
     print('Game modules not found: "{}"'.format(e), file=sys.stderr)
     sys.exit(ERROR_MODULES_MISSING)
@@ -55,11 +59,56 @@ def parse_args():
     parser.add_argument(
         '-m', '--maxvalue', type=int,
         metavar='MAXVALUE', help='maximum value of cell')
+    parser.add_argument(
+        '-b', '--big', action="store_true", default=False,
+        help='use generator for big fields')
+    parser.add_argument(
+        '-d', '--seed', type=int,
+        metavar='SEED', help='seed for random generator')
+    parser.add_argument(
+        '-n', '--count', type=int,
+        metavar='COUNT', help='generate several puzzles')
+    parser.add_argument(
+        '-o', '--store', type=str,
+        metavar='FILENAME', help='add puzzles and solutions to puzzle store')
+    parser.add_argument(
+        '--check-unique', action="store_true", default=False,
+        help='check that stored puzzles have unique solution')
+    parser.add_argument(
+        '--unique-budget', type=int, default=UNIQUENESS_BUDGET,
+        metavar='NODES', help='maximum number of search nodes of uniqueness '
+                              'check (default: {})'.format(UNIQUENESS_BUDGET))
+    parser.add_argument(
+        '-q', '--query', action="store_true", default=False,
+        help='load puzzles from puzzle store instead of generating')
+    parser.add_argument(
+        '--empty-range', type=float, nargs=2,
+        metavar=('MIN', 'MAX'), help='percent of empty cells '
+                                     'of puzzles from store')
+    parser.add_argument(
+        '--unique', action="store_true", default=False,
+        help='load only puzzles with unique solution from store')
+    parser.add_argument(
+        '--limit', type=int,
+        metavar='COUNT', help='maximum number of puzzles from store')
+    parser.add_argument(
+        '-a', '--adaptive', action="store_true", default=False,
+        help='prefer values that fill cells more often')
+    parser.add_argument(
+        '-t', '--tolerance', type=float, default=0.05,
+        metavar='TOLERANCE',
+        help='maximum shift of value probabilities in adaptive mode')
+    parser.add_argument(
+        '--stats', action="store_true", default=False,
+        help='print generator statistics to stderr')
+    parser.add_argument(
+        '--profile-memory', action="store_true", default=False,
+        help='print memory usage of every phase to stderr')
 
     return parser.parse_args()
 
 
-def write_result(file, result, colored):
+def write_result(file, result, colored, profiler=None):
     if file:
         try:
             with open(file, 'w') as output_file:
@@ -71,34 +120,122 @@ def write_result(file, result, colored):
 
     else:
         if colored:
-            result.color_state()
+            with memory_phase(profiler, 'colour'):
+                result.color_state()
         print(result)
 
 
+def write_store(file, generators, unity, max_value, check_unique=False,
+                unique_budget=UNIQUENESS_BUDGET):
+    try:
+        with PuzzleStore(file) as store:
+            store.add_many((generator.game_field, generator.field_state,
+                            unity, False, max_value, None,
+                            is_unique(generator.game_field,
+                                      generator.field_state, unity, False,
+                                      max_value, unique_budget)
+                            if check_unique else None)
+                           for generator in generators)
+
+    except Exception as e:
+        print('Error while writing to file\n{}'.format(e), file=sys.stderr)
+        sys.exit(ERROR_WRITING_TO_FILE)
+
+
+def read_store(args):
+    min_empty, max_empty = args.empty_range or (None, None)
+    try:
+        with PuzzleStore(args.store) as store:
+            records = list(store.query(
+                args.size, args.maxvalue, min_empty, max_empty,
+                bool(args.unity), unique=True if args.unique else None,
+                limit=args.limit))
+
+    except Exception as e:
+        print('Error while reading from file\n{}'.format(e), file=sys.stderr)
+        sys.exit(ERROR_READING_FROM_FILE)
+
+    for record in records:
+        print('{}: size {}, {}% empty, cost {}, unique {}'.format(
+            record.id, record.size, record.empty, record.cost,
+            record.unique), file=sys.stderr)
+
+    write_result(args.puzzle, '\n'.join(
+        str(record.puzzle) for record in records), False)
+    write_result(args.solution, '\n'.join(
+        str(record.solution) for record in records
+        if record.solution is not None), False)
+
+
+def generate_puzzle(args, profiler):
+    generator_class = PuzzleGenerator
+    if args.big:
+        generator_class = LargePuzzleGenerator
+
+    generator = generator_class(args.size, args.maxvalue or 9, args.seed,
+                                args.adaptive, args.tolerance)
+    with memory_phase(profiler, 'generate'):
+        generator.generate_filled_field()
+
+    with memory_phase(profiler, 'blank'):
+        if args.empty:
+            generator.generate_field_for_game(bool(args.unity), args.empty)
+        else:
+            generator.generate_field_for_game(bool(args.unity))
+
+    return generator
+
+
 def main():
     args = parse_args()
 
+    if args.query:
+        read_store(args)
+        return
+
     if args.size:
+        profiler = MemoryProfiler() if args.profile_memory else None
         try:
-            if args.maxvalue:
-                generator = PuzzleGenerator(args.size, args.maxvalue)
+            if args.count:
+                with memory_phase(profiler, 'generate'):
+                    generators = generate_many(
+                        args.count, args.size, args.empty or 50,
+                        bool(args.unity), args.maxvalue or 9, args.big,
+                        args.seed, adaptive=args.adaptive,
+                        tolerance=args.tolerance)
             else:
-                generator = PuzzleGenerator(args.size)
-            generator.generate_filled_field()
-
-            if args.empty:
-                generator.generate_field_for_game(bool(args.unity), args.empty)
-            else:
-                generator.generate_field_for_game(bool(args.unity))
-
-            write_result(args.puzzle, generator.game_field, args.color)
-            write_result(args.solution, generator.field_state, args.color)
+                generators = [generate_puzzle(args, profiler)]
 
         except Exception as e:
             print('Error while generating puzzle\n{}'.format(e),
                   file=sys.stderr)
             sys.exit(ERROR_GENERATING_PUZZLE)
 
+        if args.store:
+            write_store(args.store, generators, bool(args.unity),
+                        args.maxvalue or 9, args.check_unique,
+                        args.unique_budget)
+        elif args.count:
+            write_result(args.puzzle, '\n'.join(
+                str(generator.game_field) for generator in generators), False)
+            write_result(args.solution, '\n'.join(
+                str(generator.field_state) for generator in generators),
+                False)
+        else:
+            write_result(args.puzzle, generators[0].game_field, args.color,
+                         profiler)
+            write_result(args.solution, generators[0].field_state,
+                         args.color, profiler)
+
+        if args.stats:
+            stats = GeneratorStats()
+            for generator in generators:
+                stats.merge(generator.stats)
+            print(stats.report(), file=sys.stderr)
+
+        if profiler is not None:
+            print(profiler.report(), file=sys.stderr)
+
 
 if __name__ == '__main__':
     main()
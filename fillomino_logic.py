@@ -1,15 +1,276 @@
 #!/usr/bin/env python3
 
+import array
 import collections
+import concurrent.futures
+import contextlib
+import multiprocessing
 import random
+import sqlite3
 import copy
+import hashlib
+import heapq
+import itertools
+import struct
+import threading
+import time
+import tracemalloc
+
+try:
+    import numba
+    import numpy
+except ImportError:
+    numba = None
+
+
+KERNELS_COMPILED = numba is not None
+
+
+def _kernel(function):
+    if numba is not None:
+        function = numba.njit(cache=True)(function)
+    return function
+
+
+def _python_kernel(kernel):
+    return getattr(kernel, 'py_func', kernel)
+
+
+def _new_buffer(length, value=0):
+    if numba is None:
+        return [value] * length
+    return numpy.full(length, value, dtype=numpy.int64)
+
+
+@_kernel
+def _involved_kernel(values, neighbours, start, seen, stack, result):
+    value = values[start]
+    seen[start] = 1
+    result[0] = start
+    stack[0] = start
+    count = 1
+    top = 1
+
+    while top:
+        top -= 1
+        cell = stack[top]
+        for index in range(cell * 6, cell * 6 + 6):
+            neighbour = neighbours[index]
+            if (neighbour >= 0 and not seen[neighbour]
+                    and values[neighbour] == value):
+                seen[neighbour] = 1
+                result[count] = neighbour
+                count += 1
+                stack[top] = neighbour
+                top += 1
+
+    for index in range(count):
+        seen[result[index]] = 0
+    return count
+
+
+@_kernel
+def _check_groups_kernel(values, neighbours, seen, stack, result):
+    bad_cell = -1
+    bad_size = 0
+    count = 0
+
+    for start in range(len(values)):
+        if seen[start]:
+            continue
+        value = values[start]
+        if value == 0:
+            bad_cell = start
+            break
+
+        group_start = count
+        seen[start] = 1
+        result[count] = start
+        count += 1
+        stack[0] = start
+        top = 1
+        while top:
+            top -= 1
+            cell = stack[top]
+            for index in range(cell * 6, cell * 6 + 6):
+                neighbour = neighbours[index]
+                if (neighbour >= 0 and not seen[neighbour]
+                        and values[neighbour] == value):
+                    seen[neighbour] = 1
+                    result[count] = neighbour
+                    count += 1
+                    stack[top] = neighbour
+                    top += 1
+
+        if count - group_start != value:
+            bad_cell = start
+            bad_size = count - group_start
+            break
+
+    for index in range(count):
+        seen[result[index]] = 0
+    return bad_cell, bad_size
+
+
+_START, _POSSIBLE, _CONNECTION, _BLOCKED, _JOINED = range(5)
+
+
+@_kernel
+def _expansion_kernel(values, neighbours, starts_count, value, seen, stack,
+                      result):
+    for index in range(starts_count):
+        seen[result[index]] = -1
+        result[index] = result[index] * 8 + _START
+    count = starts_count
+    free_length = value - starts_count
+    head = 0
+
+    while head < count:
+        entry = result[head]
+        head += 1
+        if entry % 8 > _CONNECTION:
+            continue
+        cell = entry // 8
+        distance = max(seen[cell], 0) + 1
+        if distance > free_length:
+            continue
+
+        for index in range(cell * 6, cell * 6 + 6):
+            neighbour = neighbours[index]
+            if neighbour < 0 or seen[neighbour] or values[neighbour]:
+                continue
+            seen[neighbour] = distance
+            position = count
+            count += 1
+
+            joined = 0
+            for joined_index in range(neighbour * 6, neighbour * 6 + 6):
+                start = neighbours[joined_index]
+                if (start < 0 or values[start] != value or seen[start] == -1
+                        or seen[start] == position):
+                    continue
+                if not seen[start]:
+                    result[count] = start * 8 + _JOINED
+                    count += 1
+                seen[start] = position
+                joined += 1
+                stack[0] = start
+                top = 1
+                while top:
+                    top -= 1
+                    group_cell = stack[top]
+                    for group_index in range(group_cell * 6,
+                                             group_cell * 6 + 6):
+                        group_neighbour = neighbours[group_index]
+                        if (group_neighbour < 0
+                                or values[group_neighbour] != value
+                                or seen[group_neighbour] == position):
+                            continue
+                        if not seen[group_neighbour]:
+                            result[count] = group_neighbour * 8 + _JOINED
+                            count += 1
+                        seen[group_neighbour] = position
+                        joined += 1
+                        stack[top] = group_neighbour
+                        top += 1
+
+            kind = _BLOCKED
+            if not joined:
+                kind = _POSSIBLE
+            elif joined + starts_count + distance <= value:
+                kind = _CONNECTION
+            result[position] = neighbour * 8 + kind
+
+    for index in range(count):
+        seen[result[index] // 8] = 0
+    return count
 
 
 class Field:
+    _geometry_cache = {}
+    _symmetry_cache = {}
+    _bitboard_cache = {}
+    _geometry_lock = threading.Lock()
+
     def __init__(self, size):
         self.check_size(size)
         self._size = size
 
+        with self._geometry_lock:
+            geometry = self._geometry_cache.get(size)
+            if geometry is None:
+                geometry = self._build_geometry()
+                self._geometry_cache[size] = geometry
+        (self._cells, self._row_offsets, self._neighbours, self._axial,
+         self._index, self._neighbour_table) = geometry
+
+    def _build_geometry(self):
+        self._cells = tuple(self._generate_cells())
+        self._row_offsets = tuple(itertools.accumulate(itertools.chain(
+            [0], (self._size + min(x, self._size * 2 - 2 - x)
+                  for x in range(self._size * 2 - 1)))))
+        neighbours = {cell: tuple(self._find_neighbour_cells(cell))
+                      for cell in self._cells}
+        axial = {cell: (cell[1] - min(cell[0], self._size - 1), cell[0])
+                 for cell in self._cells}
+        index = {cell: self.get_cell_id(cell) for cell in self._cells}
+
+        neighbour_table = _new_buffer(len(self._cells) * 6, -1)
+        for cell in self._cells:
+            for number, neighbour in enumerate(neighbours[cell]):
+                neighbour_table[index[cell] * 6 + number] = index[neighbour]
+
+        return (self._cells, self._row_offsets, neighbours, axial, index,
+                neighbour_table)
+
+    def get_symmetries(self):
+        with self._geometry_lock:
+            symmetries = self._symmetry_cache.get(self._size)
+            if symmetries is None:
+                symmetries = self._build_symmetries()
+                self._symmetry_cache[self._size] = symmetries
+        return symmetries
+
+    def get_bitboard(self):
+        with self._geometry_lock:
+            bitboard = self._bitboard_cache.get(self._size)
+            if bitboard is None:
+                bitboard = self._build_bitboard()
+                self._bitboard_cache[self._size] = bitboard
+        return bitboard
+
+    def _build_bitboard(self):
+        width = self._size * 2
+        bits = {cell: 1 << (r * width + q + self._size - 1)
+                for cell, (q, r) in self._axial.items()}
+        cells = {bit.bit_length() - 1: cell for cell, bit in bits.items()}
+        neighbour_masks = {
+            cell: sum(bits[n] for n in self._neighbours[cell])
+            for cell in self._cells}
+        return bits, cells, neighbour_masks, sum(bits.values()), width
+
+    def _build_symmetries(self):
+        centre_q, centre_r = self._axial[(self._size - 1, self._size - 1)]
+        cells = {}
+        for cell in self._cells:
+            q, r = self._axial[cell]
+            cells[(q - centre_q, r - centre_r)] = cell
+
+        symmetries = []
+        for reflected in (False, True):
+            for rotation in range(6):
+                order = []
+                for q, r in cells:
+                    x, y, z = q, r, -q - r
+                    if reflected:
+                        y, z = z, y
+                    for _ in range(rotation):
+                        x, y, z = -z, -x, -y
+                    order.append(cells[(x, y)])
+                symmetries.append(tuple(order))
+
+        return symmetries
+
     @staticmethod
     def check_size(size):
         if type(size) is not int:
@@ -21,7 +282,7 @@ class Field:
     def size(self):
         return self._size
 
-    def get_all_cells(self):
+    def _generate_cells(self):
         row_length = self._size
 
         for x in range(self._size * 2 - 1):
@@ -32,7 +293,45 @@ class Field:
             else:
                 row_length -= 1
 
+    def get_all_cells(self):
+        return self._cells
+
+    def get_cell_index(self):
+        return self._index
+
+    def get_cell_id(self, cell):
+        x, y = cell
+        if 0 <= x < len(self._row_offsets) - 1 and y >= 0:
+            cell_id = self._row_offsets[x] + y
+            if cell_id < self._row_offsets[x + 1]:
+                return cell_id
+        return None
+
+    def __contains__(self, cell):
+        return self.get_cell_id(cell) is not None
+
+    def order_cells(self, cells):
+        return sorted(cells, key=self._index.__getitem__)
+
+    def get_neighbour_table(self):
+        return self._neighbour_table
+
     def get_neighbour_cells(self, cell):
+        neighbours = self._neighbours.get(cell)
+        if neighbours is None:
+            return tuple(self._find_neighbour_cells(cell))
+        return neighbours
+
+    def get_axial(self, cell):
+        return self._axial[cell]
+
+    def get_distance(self, cell, other_cell):
+        q, r = self._axial[cell]
+        other_q, other_r = self._axial[other_cell]
+        return (abs(q - other_q) + abs(r - other_r)
+                + abs(q + r - other_q - other_r)) // 2
+
+    def _find_neighbour_cells(self, cell):
         for x in range(-1, 2):
             for y in range(-1, 2):
                 if (cell[0] < self._size - 1 and x == -y
@@ -40,9 +339,8 @@ class Field:
                         or cell[0] > self._size - 1 and x == y):
                     continue
 
-                neighbour_cell = tuple(map(sum, zip((x, y), cell)))
-                if (neighbour_cell in list(self.get_all_cells())
-                        and neighbour_cell != cell):
+                neighbour_cell = (cell[0] + x, cell[1] + y)
+                if neighbour_cell in self and neighbour_cell != cell:
                     yield neighbour_cell
 
 
@@ -57,8 +355,17 @@ class FieldState:
     def __init__(self, field):
         self.field = field
         self._state = collections.defaultdict(lambda: 0)
+        self._index = field.get_cell_index()
+        self._values = None
+        if KERNELS_COMPILED:
+            self._values = _new_buffer(len(self._index))
+        self._scratch = None
         self._colored_cells = {}
         self._colored_state = {}
+        self._changes = None
+        self._neighbour_values = None
+        self._empty = set(field.get_all_cells())
+        self._filled = set()
 
     def __str__(self):
         result = ""
@@ -100,15 +407,15 @@ class FieldState:
 
         return result
 
-    @staticmethod
-    def from_string_to_state(string_state):
+    @classmethod
+    def from_string_to_state(cls, string_state):
         rows = string_state.strip().split('\n')
         size = len(rows[0].split())
         if size * 2 - 1 != len(rows):
             raise ValueError('Wrong format of field state')
 
         field = Field(size)
-        state = FieldState(field)
+        state = cls(field)
         row_length = size
 
         for row_number, row in enumerate(rows):
@@ -131,17 +438,103 @@ class FieldState:
 
         if type(value) is not int:
             raise TypeError('Value should be integer')
+
+        previous = self._state[coords]
+        if self._changes is not None and coords not in self._changes:
+            self._changes[coords] = previous
         self._state[coords] = value
+        if not previous:
+            if value:
+                self._empty.discard(coords)
+                self._filled.add(coords)
+        elif not value:
+            self._filled.discard(coords)
+            self._empty.add(coords)
+        if self._values is not None:
+            self._values[self._index[coords]] = value
+
+        if self._neighbour_values is not None and previous != value:
+            for neighbour in self.field.get_neighbour_cells(coords):
+                counts = self._neighbour_values[neighbour]
+                if counts[previous] == 1:
+                    del counts[previous]
+                else:
+                    counts[previous] -= 1
+                counts[value] = counts.get(value, 0) + 1
 
     def get_state(self, coords):
         return self._state[coords]
 
+    def track_changes(self):
+        self._changes = {}
+
+    def pop_changes(self):
+        changes = {cell: value for cell, value in self._changes.items()
+                   if self._state[cell] != value}
+        self._changes = {}
+        return changes
+
+    def stop_tracking_changes(self):
+        changes = self.pop_changes()
+        self._changes = None
+        return changes
+
+    def track_neighbour_values(self):
+        self._neighbour_values = {
+            cell: dict(collections.Counter(
+                self._state[n] for n in self.field.get_neighbour_cells(cell)))
+            for cell in self.field.get_all_cells()}
+
+    def get_neighbour_values(self, cell):
+        if self._neighbour_values is None:
+            return {self._state[n]
+                    for n in self.field.get_neighbour_cells(cell)}
+        return self._neighbour_values[cell].keys()
+
     def get_full_state(self):
         return self._state
 
+    def get_empty_cells(self):
+        return self._empty
+
+    def get_filled_cells(self):
+        return self._filled
+
+    def pack(self):
+        return self._pack_cells(self.field.get_all_cells())
+
+    def _pack_cells(self, cells):
+        values = [self._state[cell] for cell in cells]
+        code = 'B' if max(values) < 256 else 'H'
+        return struct.pack('<Hc{}{}'.format(len(values), code),
+                           self.field.size(), code.encode(), *values)
+
+    @classmethod
+    def unpack(cls, data):
+        size, code = struct.unpack_from('<Hc', data)
+        state = cls(Field(size))
+        cells = state.field.get_all_cells()
+        values = struct.unpack_from(
+            '<{}{}'.format(len(cells), code.decode()), data, 3)
+
+        for cell, value in zip(cells, values):
+            state.set_state(cell, value)
+        return state
+
+    def canonical_hash(self):
+        return hashlib.sha1(min(
+            self._pack_cells(cells)
+            for cells in self.field.get_symmetries())).hexdigest()
+
     def clear_state(self):
         for cell in self.field.get_all_cells():
             self._state[cell] = 0
+        self._empty.update(self.field.get_all_cells())
+        self._filled.clear()
+        if self._values is not None:
+            self._values[:] = 0
+        if self._neighbour_values is not None:
+            self.track_neighbour_values()
 
     def neighbours_differ(self, cell, prev_cells, number):
         for cell in self.field.get_neighbour_cells(cell):
@@ -151,8 +544,28 @@ class FieldState:
 
         return True
 
+    def _get_scratch(self):
+        if self._scratch is None:
+            self._scratch = tuple(_new_buffer(len(self._index))
+                                  for _ in range(3))
+        return self._scratch
+
+    def _get_values(self):
+        if self._values is not None:
+            return self._values
+        return [self._state[cell] for cell in self.field.get_all_cells()]
+
     def get_involved(self, cell):
+        if self._values is not None:
+            seen, stack, result = self._get_scratch()
+            count = _involved_kernel(self._values,
+                                     self.field.get_neighbour_table(),
+                                     self._index[cell], seen, stack, result)
+            cells = self.field.get_all_cells()
+            return [cells[result[number]] for number in range(count)]
+
         involved = [cell]
+        involved_set = {cell}
         value = self._state[cell]
         not_checked = [cell]
 
@@ -160,13 +573,83 @@ class FieldState:
             cell = not_checked.pop()
 
             for neighbour in self.field.get_neighbour_cells(cell):
-                if (neighbour not in involved
+                if (neighbour not in involved_set
                         and self._state[neighbour] == value):
                     involved.append(neighbour)
+                    involved_set.add(neighbour)
                     not_checked.append(neighbour)
 
         return involved
 
+    def get_expansion(self, cells, value):
+        if self._values is not None:
+            seen, stack, result = self._get_scratch()
+            for number, cell in enumerate(cells):
+                result[number] = self._index[cell]
+            count = _expansion_kernel(self._values,
+                                      self.field.get_neighbour_table(),
+                                      len(cells), value, seen, stack, result)
+            all_cells = self.field.get_all_cells()
+            return [(all_cells[result[number] // 8], result[number] % 8)
+                    for number in range(len(cells), count)]
+
+        distances = dict.fromkeys(cells, 0)
+        next_cells = collections.deque(cells)
+        free_length = value - len(cells)
+        joined_read = set()
+        expansion = []
+
+        while next_cells:
+            cell = next_cells.popleft()
+            distance = distances[cell] + 1
+            if distance > free_length:
+                continue
+
+            for neighbour in self.field.get_neighbour_cells(cell):
+                if neighbour in distances or self._state[neighbour] != 0:
+                    continue
+                distances[neighbour] = distance
+
+                joined = []
+                joined_set = set()
+                for start in self.field.get_neighbour_cells(neighbour):
+                    if (self._state[start] == value and start not in distances
+                            and start not in joined_set):
+                        group = self.get_involved(start)
+                        joined.extend(group)
+                        joined_set.update(group)
+
+                kind = _BLOCKED
+                if not joined:
+                    kind = _POSSIBLE
+                    next_cells.append(neighbour)
+                elif len(joined) + len(cells) + distance <= value:
+                    kind = _CONNECTION
+                    next_cells.append(neighbour)
+                expansion.append((neighbour, kind))
+
+                for joined_cell in joined:
+                    if joined_cell not in joined_read:
+                        joined_read.add(joined_cell)
+                        expansion.append((joined_cell, _JOINED))
+
+        return expansion
+
+    def check_solution(self):
+        seen, stack, result = self._get_scratch()
+        cell, size = _check_groups_kernel(
+            self._get_values(), self.field.get_neighbour_table(), seen, stack,
+            result)
+        if cell < 0:
+            return
+
+        cell = self.field.get_all_cells()[cell]
+        value = self._state[cell]
+        if value == 0:
+            raise ValueError('Empty cell {}'.format(cell))
+        raise ValueError('Group {} of value {} has {} cells'.format(
+            cell, value, size))
+
     def color_state(self):
         self.get_cells_colors()
 
@@ -230,50 +713,203 @@ class FieldState:
         return self._colored_cells[cell] == color
 
 
+class BitboardFieldState(FieldState):
+    def __init__(self, field):
+        super().__init__(field)
+        (self._bits, self._bit_cells, self._neighbour_masks, self._board,
+         self._width) = field.get_bitboard()
+        self._layers = {0: self._board}
+
+    def set_state(self, coords, value):
+        previous = self._state[coords]
+        super().set_state(coords, value)
+        if previous == value:
+            return
+
+        bit = self._bits[coords]
+        layer = self._layers[previous] ^ bit
+        if layer:
+            self._layers[previous] = layer
+        else:
+            del self._layers[previous]
+        self._layers[value] = self._layers.get(value, 0) | bit
+
+    def clear_state(self):
+        super().clear_state()
+        self._layers = {0: self._board}
+
+    def neighbours_differ(self, cell, prev_cells, number):
+        mask = self._neighbour_masks[cell] & self._layers.get(number, 0)
+        if not mask or not prev_cells:
+            return not mask
+        return all(neighbour in prev_cells
+                   for neighbour in self._mask_cells(mask))
+
+    def _mask_cells(self, mask):
+        bits = bin(mask)[:1:-1]
+        position = bits.find('1')
+        while position >= 0:
+            yield self._bit_cells[position]
+            position = bits.find('1', position + 1)
+
+    def _grow(self, mask):
+        width = self._width
+        return (mask | mask << 1 | mask >> 1 | mask << width | mask >> width
+                | mask << (width - 1) | mask >> (width - 1)) & self._board
+
+    def _flood(self, mask, region):
+        while True:
+            grown = self._grow(mask) & region
+            if grown == mask:
+                return mask
+            mask = grown
+
+    def get_involved(self, cell):
+        start = self._bits[cell]
+        involved = self._flood(start, self._layers[self._state[cell]])
+        return [cell] + list(self._mask_cells(involved ^ start))
+
+
 class CellsGroup:
+    __slots__ = ('value', '_initial_cells', '_initial_set', 'possible_cells',
+                 '_possible_set', 'possible_connection_cells',
+                 '_connection_set', '_possible_length')
+
     def __init__(self, value, initial_cells):
         self.value = value
-        self.initial_cells = initial_cells
         self.possible_cells = []
+        self._possible_set = set()
         self.possible_connection_cells = []
+        self._connection_set = set()
+        self.initial_cells = initial_cells
+
+    def __contains__(self, cell):
+        return (cell in self._initial_set or cell in self._possible_set
+                or cell in self._connection_set)
+
+    @property
+    def initial_cells(self):
+        return self._initial_cells
+
+    @initial_cells.setter
+    def initial_cells(self, cells):
+        self._initial_cells = cells
+        self._initial_set = set(cells)
+        self._possible_length = (len(cells) + len(self.possible_cells)
+                                 + len(self.possible_connection_cells))
 
     def get_value(self):
         return self.value
 
     def get_possible_length(self):
-        return (len(self.initial_cells) + len(self.possible_cells)
-                + len(self.possible_connection_cells))
+        return self._possible_length
 
     def add_possible_cell(self, cell):
-        if cell not in self.possible_cells:
+        if cell not in self._possible_set:
+            self._possible_set.add(cell)
             self.possible_cells.append(cell)
+            self._possible_length += 1
 
     def add_connection(self, cell):
-        if cell not in self.possible_connection_cells:
+        if cell not in self._connection_set:
+            self._connection_set.add(cell)
             self.possible_connection_cells.append(cell)
+            self._possible_length += 1
+
+
+class GeneratorStats:
+    COUNTERS = ('fields', 'restarts', 'choices', 'attempts', 'failures')
+
+    def __init__(self):
+        self.fields = collections.Counter()
+        self.restarts = collections.Counter()
+        self.choices = collections.Counter()
+        self.attempts = collections.Counter()
+        self.failures = collections.Counter()
+
+    def merge(self, other):
+        for name in self.COUNTERS:
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def success_rate(self, size, value):
+        attempts = self.attempts[(size, value)]
+        return (attempts - self.failures[(size, value)] + 1) / (attempts + 2)
+
+    def report(self):
+        lines = []
+        for size in sorted(self.fields):
+            fields = self.fields[size]
+            lines.append('Size {}: {} fields, {} restarts ({:.2f} per field)'
+                         .format(size, fields, self.restarts[size],
+                                 self.restarts[size] / fields))
+
+            values = sorted(value for key, value in self.attempts
+                            if key == size)
+            chosen = sum(self.choices[(size, value)] for value in values)
+            for value in values:
+                attempts = self.attempts[(size, value)]
+                lines.append(
+                    '  value {}: chosen {:.1%}, {} attempts, {:.1%} failed'
+                    .format(value, self.choices[(size, value)] / chosen,
+                            attempts,
+                            self.failures[(size, value)] / attempts))
+
+        return '\n'.join(lines)
 
 
 class PuzzleGenerator:
-    def __init__(self, size, max_value=9):
+    def __init__(self, size, max_value=9, seed=None, adaptive=False,
+                 tolerance=0.05):
+        if tolerance < 0:
+            raise ValueError('Tolerance should be non-negative')
+        if max_value < 2:
+            raise ValueError('Max value should be at least 2')
+
         self.size = size
+        self.random = random.Random(seed)
         self.field = Field(self.size)
         self.field_state = FieldState(self.field)
         self.game_field = None
         self.groups = []
         self.max_value = max_value
+        self.adaptive = adaptive
+        self.tolerance = tolerance
+        self.stats = GeneratorStats()
 
     def generate_filled_field(self):
         while not self._field_generated():
+            self.stats.restarts[self.size] += 1
             self.field_state.clear_state()
             self.groups = []
+        self.stats.fields[self.size] += 1
+
+    def _choose_value(self):
+        if self.adaptive:
+            values = range(2, self.max_value + 1)
+            value = self.random.choices(values, self._value_weights(values))[0]
+        else:
+            value = self.random.randint(2, self.max_value)
+        self.stats.choices[(self.size, value)] += 1
+        return value
+
+    def _value_weights(self, values):
+        rates = [self.stats.success_rate(self.size, value) for value in values]
+        total = sum(rates)
+        share = 1 / len(rates)
+        deviation = max(abs(rate / total - share) for rate in rates)
+        mix = 1
+        if deviation > self.tolerance:
+            mix = self.tolerance / deviation
+        return [share + mix * (rate / total - share) for rate in rates]
 
     def _field_generated(self):
         all_cells = list(self.field.get_all_cells())
-        random.shuffle(all_cells)
+        self.random.shuffle(all_cells)
 
-        for cell in filter(lambda x: self.field_state.get_state(x) == 0,
-                           all_cells):
-            number = random.randint(2, self.max_value)
+        empty_cells = self.field_state.get_empty_cells()
+        for cell in filter(empty_cells.__contains__, all_cells):
+            number = self._choose_value()
 
             while not self._cells_involved(cell, number):
                 number -= 1
@@ -283,13 +919,22 @@ class PuzzleGenerator:
         return True
 
     def _find_next_cells(self, cell, value):
+        empty_cells = self.field_state.get_empty_cells()
         for next_cell in self.field.get_neighbour_cells(cell):
-            if (self.field_state.get_state(next_cell) == 0
+            if (next_cell in empty_cells
                     and self.field_state.neighbours_differ(
                         next_cell, [cell], value)):
                 yield next_cell
 
     def _cells_involved(self, cell, value):
+        self.stats.attempts[(self.size, value)] += 1
+        if self._group_placed(cell, value):
+            return True
+
+        self.stats.failures[(self.size, value)] += 1
+        return False
+
+    def _group_placed(self, cell, value):
         if not self.field_state.neighbours_differ(cell, [], value):
             return False
 
@@ -312,14 +957,15 @@ class PuzzleGenerator:
         return True
 
     def generate_field_for_game(self, unity, percent=50):
-        self.game_field = copy.deepcopy(self.field_state)
+        self.game_field = copy.deepcopy(
+            self.field_state, {id(self.field): self.field})
 
         if not unity:
             groups = list(filter(lambda g: g.get_value() != 1, self.groups))
         else:
             groups = self.groups
 
-        max_empty = int(len(list(self.field.get_all_cells())) * percent / 100)
+        max_empty = int(len(self.field.get_all_cells()) * percent / 100)
         total_empty = 0
 
         for group in groups:
@@ -328,78 +974,489 @@ class PuzzleGenerator:
             if ((group.get_value() == 1 or group_empty + 1 < group.get_value())
                     and total_empty + group_empty < max_empty
                     and group_empty < group.get_value()):
-                group_empty += random.randint(0, 1)
+                group_empty += self.random.randint(0, 1)
             if total_empty + group_empty > max_empty:
                 break
 
             total_empty += group_empty
-            random_group_cells = random.sample(
+            random_group_cells = self.random.sample(
                 group.initial_cells, group_empty)
 
             for cell in random_group_cells:
                 self.game_field.set_state(cell, 0)
 
 
+class LargePuzzleGenerator(PuzzleGenerator):
+    def generate_filled_field(self):
+        not_filled = list(self.field.get_all_cells())
+        self.random.shuffle(not_filled)
+        cells_groups = {}
+        removed_groups = set()
+
+        while not_filled:
+            cell = not_filled.pop()
+            if self.field_state.get_state(cell) != 0:
+                continue
+
+            number = self._choose_value()
+            while number and not self._cells_involved(cell, number):
+                number -= 1
+
+            if number:
+                for group_cell in self.groups[-1].initial_cells:
+                    cells_groups[group_cell] = self.groups[-1]
+                continue
+
+            if not self._cell_absorbed(cell, cells_groups):
+                self.stats.restarts[self.size] += 1
+                not_filled.extend(self._clear_neighbour_groups(
+                    cell, cells_groups, removed_groups))
+                not_filled.append(cell)
+
+        self.groups = [g for g in self.groups if g not in removed_groups]
+        self.stats.fields[self.size] += 1
+
+    def _cell_absorbed(self, cell, cells_groups):
+        groups = []
+        for neighbour in self.field.get_neighbour_cells(cell):
+            group = cells_groups.get(neighbour)
+            if group is not None and group not in groups:
+                groups.append(group)
+        self.random.shuffle(groups)
+
+        for group in groups:
+            value = len(group.initial_cells) + 1
+            if value > self.max_value:
+                continue
+
+            cells = group.initial_cells + [cell]
+            cells_set = set(cells)
+            if all(self.field_state.neighbours_differ(c, cells_set, value)
+                   for c in cells):
+                for group_cell in cells:
+                    self.field_state.set_state(group_cell, value)
+                    cells_groups[group_cell] = group
+                group.value = value
+                group.initial_cells = cells
+                return True
+
+        return False
+
+    def _clear_neighbour_groups(self, cell, cells_groups, removed_groups):
+        cleared_cells = []
+
+        for neighbour in self.field.get_neighbour_cells(cell):
+            group = cells_groups.get(neighbour)
+            if group is None or group in removed_groups:
+                continue
+
+            removed_groups.add(group)
+            for group_cell in group.initial_cells:
+                self.field_state.set_state(group_cell, 0)
+                del cells_groups[group_cell]
+                cleared_cells.append(group_cell)
+
+        self.random.shuffle(cleared_cells)
+        return cleared_cells
+
+
+MemoryPhase = collections.namedtuple(
+    'MemoryPhase', ['name', 'peak', 'retained', 'top_allocations'])
+
+MemoryAllocation = collections.namedtuple(
+    'MemoryAllocation', ['location', 'size', 'count'])
+
+
+class MemoryProfiler:
+    def __init__(self, top=10):
+        self.top = top
+        self.phases = []
+        self._peaks = []
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self._peaks:
+            self._peaks[-1] = max(self._peaks[-1],
+                                  tracemalloc.get_traced_memory()[1])
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        start_current = tracemalloc.get_traced_memory()[0]
+        start_snapshot = self._take_snapshot()
+        self._peaks.append(0)
+
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._peaks.pop())
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], peak)
+            top_allocations = [
+                MemoryAllocation('{}:{}'.format(stat.traceback[0].filename,
+                                                stat.traceback[0].lineno),
+                                 stat.size_diff, stat.count_diff)
+                for stat in self._take_snapshot().compare_to(
+                    start_snapshot, 'lineno')[:self.top]
+                if stat.size_diff > 0]
+            if started:
+                tracemalloc.stop()
+
+            self.phases.append(MemoryPhase(
+                name, max(peak - start_current, 0), current - start_current,
+                top_allocations))
+
+    @staticmethod
+    def _take_snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, contextlib.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>')))
+
+    def report(self):
+        lines = []
+        for phase in self.phases:
+            lines.append('{}: peak {:.1f} KiB, retained {:.1f} KiB'.format(
+                phase.name, phase.peak / 1024, phase.retained / 1024))
+            for allocation in phase.top_allocations:
+                lines.append('    {:.1f} KiB in {} blocks: {}'.format(
+                    allocation.size / 1024, allocation.count,
+                    allocation.location))
+
+        return '\n'.join(lines)
+
+
+@contextlib.contextmanager
+def memory_phase(profiler, name):
+    if profiler is None:
+        yield
+    else:
+        with profiler.phase(name):
+            yield
+
+
+TraceEvent = collections.namedtuple(
+    'TraceEvent', ['event', 'cell', 'value', 'depth', 'time'])
+
+TraceSummary = collections.namedtuple(
+    'TraceSummary', ['events', 'max_depth', 'nodes_per_depth',
+                     'conflicts_per_cell', 'conflicts_per_depth',
+                     'time_per_depth', 'total_time'])
+
+
+class SearchTrace:
+    DECISION = 1
+    PROPAGATED = 2
+    CONFLICT = 3
+    BACKTRACK = 4
+    SOLVED = 5
+
+    EVENT_NAMES = {
+        DECISION: 'decision',
+        PROPAGATED: 'propagated',
+        CONFLICT: 'conflict',
+        BACKTRACK: 'backtrack',
+        SOLVED: 'solved'
+    }
+
+    MAGIC = b'FTRC\x02'
+    RECORD = struct.Struct('<BHHHId')
+
+    def __init__(self, file):
+        self.file = file
+        self.file.write(self.MAGIC)
+        self._start = time.perf_counter()
+
+    def record(self, event, cell, value, depth):
+        self.file.write(self.RECORD.pack(
+            event, cell[0], cell[1], value, depth,
+            time.perf_counter() - self._start))
+
+    @classmethod
+    def read(cls, file):
+        if file.read(len(cls.MAGIC)) != cls.MAGIC:
+            raise ValueError('Wrong format of search trace')
+
+        while True:
+            data = file.read(cls.RECORD.size)
+            if len(data) < cls.RECORD.size:
+                return
+            event, x, y, value, depth, timestamp = cls.RECORD.unpack(data)
+            yield TraceEvent(event, (x, y), value, depth, timestamp)
+
+    @classmethod
+    def summarize(cls, events):
+        counts = collections.Counter()
+        nodes_per_depth = collections.Counter()
+        conflicts_per_cell = collections.Counter()
+        conflicts_per_depth = collections.Counter()
+        time_per_depth = collections.defaultdict(float)
+        previous = None
+
+        for event in events:
+            counts[cls.EVENT_NAMES[event.event]] += 1
+            if event.event == cls.DECISION:
+                nodes_per_depth[event.depth] += 1
+            elif event.event == cls.CONFLICT:
+                conflicts_per_cell[event.cell] += 1
+                conflicts_per_depth[event.depth] += 1
+
+            if previous is not None:
+                time_per_depth[previous.depth] += event.time - previous.time
+            previous = event
+
+        return TraceSummary(
+            counts, max(nodes_per_depth, default=0), nodes_per_depth,
+            conflicts_per_cell, conflicts_per_depth, dict(time_per_depth),
+            previous.time if previous is not None else 0.0)
+
+
+class BudgetExceededError(Exception):
+    pass
+
+
+Hint = collections.namedtuple('Hint', ['rule', 'cells', 'value'])
+
+
 class PuzzleSolver:
-    def __init__(self, string_state, unity=False, strict=False):
-        self.field_state = FieldState.from_string_to_state(string_state)
+    STATE_CLASS = FieldState
+    RULE_PRIORITY = {'join_groups_if_one_connection': 0,
+                     'fill_group_if_no_other_variants': 1,
+                     'fill_cells_with_one_value': 2}
+    PROBE_BUDGET = 1000
+
+    def __init__(self, string_state, unity=False, strict=False,
+                 max_value=None, budget=None, probe_budget=None):
+        self.field_state = self.STATE_CLASS.from_string_to_state(
+            string_state)
+        self.field_state.track_neighbour_values()
         self.involved = []
         self.possible_values = collections.defaultdict(lambda: [])
         self.unfilled_groups = {}
-        self.state_changed = True
+        self._queue = []
+        self._queue_order = itertools.count()
         self.unity = unity
         self.strict = strict
+        self.budget = budget
+        self.nodes = 0
+        self.profiler = None
+        self.trace = None
+        self.probe_budget = probe_budget
+        if probe_budget is None:
+            self.probe_budget = self.PROBE_BUDGET
+        self.probes = 0
+        self.pruned_values = 0
+        self._excluded_values = collections.defaultdict(set)
+        self.max_value = max_value
+        if max_value is None:
+            self.max_value = max(
+                [9] + list(self.field_state.get_full_state().values()))
 
     def solve(self):
-        self._refresh_state()
-
-        while self.state_changed:
-            self.state_changed = False
-            self._join_groups_if_one_connection()
-            self._fill_group_if_no_other_variants()
-            self._fill_cells_with_one_value()
+        with memory_phase(self.profiler, 'propagate'):
+            self._refresh_state()
+            self._propagate()
+            self._probe_values()
+            self._check_feasibility()
+
+        with memory_phase(self.profiler, 'search'):
+            self._try_fill_empty_cells()
+
+    def _propagate(self):
+        del self._queue[:]
+        while True:
+            self._schedule(dict.fromkeys(self.unfilled_groups.values()))
+            self._schedule(self._cells_to_check())
+            if not self._queue:
+                return
+
+            while self._queue:
+                deduction = self._deduction(heapq.heappop(self._queue)[-1])
+                if deduction is not None:
+                    self._fill_cells(deduction.cells, deduction.value)
+            self._refresh_state()
 
-        self._try_fill_empty_cells()
+    def _schedule(self, items):
+        for item in items:
+            deduction = self._deduction(item)
+            if deduction is None:
+                continue
+            key = (item.initial_cells[0] if isinstance(item, CellsGroup)
+                   else item)
+            heapq.heappush(self._queue, (
+                self.RULE_PRIORITY[deduction.rule], key,
+                next(self._queue_order), item))
+
+    def _deduction(self, item):
+        if isinstance(item, CellsGroup):
+            if not self._is_unfilled_group(item):
+                return None
+            length = item.get_possible_length()
+            value = item.get_value()
+            if length < value and len(item.possible_connection_cells) == 1:
+                return Hint('join_groups_if_one_connection',
+                            item.possible_connection_cells[:1], value)
+            if length == value and not item.possible_connection_cells:
+                return Hint('fill_group_if_no_other_variants',
+                            list(item.possible_cells), value)
+        elif (self.field_state.get_state(item) == 0
+              and len(self.possible_values[item]) == 1):
+            return Hint('fill_cells_with_one_value', [item],
+                        self.possible_values[item][0])
+        return None
+
+    def _is_unfilled_group(self, group):
+        return self.unfilled_groups.get(group.initial_cells[0]) is group
+
+    def _probe_values(self):
+        while True:
+            cells = sorted(
+                filter(lambda c: len(self.possible_values[c]) > 1,
+                       self._cells_to_check()),
+                key=lambda c: len(self.possible_values[c]))
+            forced = False
+
+            for cell in cells:
+                for value in list(self.possible_values[cell]):
+                    if self.probes >= self.probe_budget:
+                        self._refresh_state()
+                        return
+                    if not self._value_consistent(cell, value):
+                        self._excluded_values[cell].add(value)
+                        self.pruned_values += 1
 
-    def _fill_cells_with_one_value(self):
-        for cell in filter(lambda c: self.field_state.get_state(c) == 0,
-                           self.field_state.field.get_all_cells()):
-            if len(self.possible_values[cell]) == 1:
-                self.field_state.set_state(
-                    cell, self.possible_values[cell].pop())
                 self._refresh_state()
+                if not self.possible_values[cell]:
+                    raise ValueError(
+                        'Puzzle is unsolvable: every value of cell {} leads '
+                        'to a contradiction'.format(cell))
+                if len(self.possible_values[cell]) == 1:
+                    forced = True
+                    break
 
-    def _join_groups_if_one_connection(self):
-        for group in self.unfilled_groups.values():
-            if (group.get_possible_length() < group.get_value()
-                    and len(group.possible_connection_cells) == 1):
-                self.field_state.set_state(
-                    group.possible_connection_cells[0], group.get_value())
-                self._refresh_state()
+            if not forced:
+                return
+            self._propagate()
+
+    def _check_feasibility(self):
+        reason = self._find_infeasibility()
+        if reason is not None:
+            raise ValueError('Puzzle is unsolvable: {}'.format(reason))
 
-    def _fill_group_if_no_other_variants(self):
-        for group in self.unfilled_groups.values():
-            if (group.get_possible_length() == group.get_value()
+    def _find_infeasibility(self):
+        field = self.field_state.field
+        reached_cells = set()
+        forced_groups = {}
+
+        for group in dict.fromkeys(self.unfilled_groups.values()):
+            value = group.get_value()
+            if (group.get_possible_length() < value
                     and not group.possible_connection_cells):
-                for cell in group.possible_cells:
-                    self.field_state.set_state(cell, group.get_value())
-                    self._refresh_state()
+                return 'group {} of value {} has no room to grow'.format(
+                    group.initial_cells[0], value)
+            reached_cells.update(group.possible_cells)
+            reached_cells.update(group.possible_connection_cells)
+
+            frontier = {n for cell in group.initial_cells
+                        for n in field.get_neighbour_cells(cell)
+                        if self.field_state.get_state(n) == 0}
+            if len(frontier) != 1:
+                continue
+            cell = frontier.pop()
+            other_group = forced_groups.setdefault(cell, group)
+            if other_group is group:
+                continue
+            if (other_group.get_value() != value
+                    or len(other_group.initial_cells)
+                    + len(group.initial_cells) >= value):
+                return 'groups {} and {} both have to grow through {}'.format(
+                    other_group.initial_cells[0], group.initial_cells[0],
+                    cell)
+
+        checked_cells = set()
+        for cell in field.order_cells(self.field_state.get_empty_cells()):
+            if not self.possible_values.get(cell):
+                return 'cell {} has no possible values'.format(cell)
+            if cell in checked_cells:
+                continue
+
+            region = self.field_state.get_involved(cell)
+            checked_cells.update(region)
+            if reached_cells.intersection(region):
+                continue
+            values = set()
+            for region_cell in region:
+                values.update(self.possible_values[region_cell])
+            if not self._region_partitioned(len(region), values):
+                return ('empty region {} of {} cells cannot be split into '
+                        'groups of values {}'.format(cell, len(region),
+                                                     sorted(values)))
+
+        return None
+
+    @staticmethod
+    def _region_partitioned(size, values):
+        partitioned = [True] + [False] * size
+        for length in range(1, size + 1):
+            partitioned[length] = any(
+                value <= length and partitioned[length - value]
+                for value in values)
+        return partitioned[size]
+
+    def _value_consistent(self, cell, value):
+        self.probes += 1
+        self.field_state.track_changes()
+
+        try:
+            self.field_state.set_state(cell, value)
+            self._check_group_size()
+            self._propagate()
+            self._check_group_size()
+            return all(self.possible_values[c] for c in self._cells_to_check())
+
+        except ValueError:
+            return False
+
+        finally:
+            for changed_cell, saved_value in (
+                    self.field_state.stop_tracking_changes().items()):
+                self.field_state.set_state(changed_cell, saved_value)
+
+    def _cells_to_check(self):
+        return self.field_state.field.order_cells(
+            self.field_state.get_empty_cells())
+
+    def _fill_cells(self, cells, value, group=None):
+        for cell in cells:
+            previous = self.field_state.get_state(cell)
+            if previous not in (0, value):
+                raise ValueError('Puzzle is unsolvable: cell {} is forced '
+                                 'to both {} and {}'.format(cell, previous,
+                                                            value))
+            self.field_state.set_state(cell, value)
+
+        size = len(self.field_state.get_involved(cells[0]))
+        if size > value:
+            raise ValueError('Puzzle is unsolvable: group {} of value {} '
+                             'has {} cells'.format(cells[0], value, size))
 
     def _refresh_state(self):
         self._find_unfilled_groups()
-        for cell in filter(lambda c: self.field_state.get_state(c) != 0
-                           and c in self.unfilled_groups,
-                           self.field_state.field.get_all_cells()):
-            self._find_possible_values(cell)
+        for group in dict.fromkeys(self.unfilled_groups.values()):
+            self._find_possible_values(group)
+            for cell in group.possible_cells + group.possible_connection_cells:
+                self._add_possible_value(cell, group.get_value())
 
-        empty_cells = list(filter(lambda c: self.field_state.get_state(c) == 0,
-                                  self.field_state.field.get_all_cells()))
+        empty_cells = self.field_state.field.order_cells(
+            self.field_state.get_empty_cells())
 
         involved_empty = set()
         for cell in empty_cells:
-            if self.unity and all(
-                    self.field_state.get_state(n) != 1
-                    for n in self.field_state.field.get_neighbour_cells(cell)):
+            if (self.unity
+                    and 1 not in self.field_state.get_neighbour_values(cell)):
                 self._add_possible_value(cell, 1)
 
             if not self.strict and cell not in involved_empty:
@@ -407,23 +1464,19 @@ class PuzzleSolver:
                 involved_empty = involved_empty.union(empty_group)
                 self._find_additional_values(empty_group)
 
-        self.state_changed = True
-
     def _find_additional_values(self, empty_group):
-        for value in range(
-                2, min(len(empty_group) + 1, 10)):
-            involved_for_value = set(empty_group)
-            not_possible_cells = set()
-
-            for involved in involved_for_value:
-                if any(self.field_state.get_state(n) == value
-                       for n in self.field_state.field.get_neighbour_cells(
-                       involved)):
-                    not_possible_cells.add(involved)
-            involved_for_value -= not_possible_cells
-
-            if value <= len(involved_for_value):
-                for cell in involved_for_value:
+        values = range(2, min(len(empty_group), self.max_value) + 1)
+        allowed_values = {}
+        blocked_cells = collections.Counter()
+        for cell in empty_group:
+            neighbour_values = self.field_state.get_neighbour_values(cell)
+            blocked_cells.update(neighbour_values)
+            allowed_values[cell] = [value for value in values
+                                    if value not in neighbour_values]
+
+        for cell, cell_values in allowed_values.items():
+            for value in cell_values:
+                if len(empty_group) - blocked_cells[value] >= value:
                     self._add_possible_value(cell, value)
 
     def _find_unfilled_groups(self):
@@ -431,8 +1484,8 @@ class PuzzleSolver:
         self.involved = []
         self.possible_values = collections.defaultdict(lambda: [])
 
-        for cell in filter(lambda x: self.field_state.get_state(x) != 0,
-                           self.field_state.field.get_all_cells()):
+        for cell in self.field_state.field.order_cells(
+                self.field_state.get_filled_cells()):
             if cell not in self.involved:
                 initial_cells = self.field_state.get_involved(cell)
                 self.involved += initial_cells
@@ -446,66 +1499,28 @@ class PuzzleSolver:
                 if len(initial_cells) > value:
                     raise ValueError('Wrong group size')
 
-    def _find_possible_values(self, cell):
-        next_cells = [(cell, 0)]
-        value = self.field_state.get_state(cell)
-        previous_cells = []
-        group = self.unfilled_groups[cell]
-
-        while next_cells:
-            current_cell, current_length = next_cells.pop()
-            previous_cells.append(current_cell)
-
-            way_length = current_length + len(group.initial_cells)
-
-            if way_length < value and current_cell != cell:
-                self._add_possible_value(current_cell, value)
-                group.add_possible_cell(current_cell)
-
-            elif way_length == value:
-                self._add_possible_value(current_cell, value)
-                group.add_possible_cell(current_cell)
-                continue
-
-            free_neighbours = filter(
-                lambda n: self.field_state.get_state(n) == 0
-                and n not in previous_cells,
-                self.field_state.field.get_neighbour_cells(current_cell))
-
-            for neighbour in free_neighbours:
-                if any(self._connection_cells_found(n, neighbour, group)
-                       for n in self.field_state.field.get_neighbour_cells(
-                        neighbour)):
-                    continue
+    def _find_possible_values(self, group):
+        read_cells = list(group.initial_cells)
+        for cell, kind in self.field_state.get_expansion(group.initial_cells,
+                                                         group.get_value()):
+            read_cells.append(cell)
+            if kind == _POSSIBLE:
+                group.add_possible_cell(cell)
+            elif kind == _CONNECTION:
+                group.add_connection(cell)
 
-                next_cells.append((neighbour, current_length + 1))
+        return read_cells
 
     def _add_possible_value(self, cell, value):
-        if value not in self.possible_values[cell]:
+        if (value not in self.possible_values[cell]
+                and value not in self._excluded_values.get(cell, ())):
             self.possible_values[cell].append(value)
 
-    def _connection_cells_found(self, neighbour, cell, group):
-        value = group.get_value()
-
-        if (self.field_state.get_state(neighbour) == value
-                and neighbour not in group.initial_cells
-                and neighbour not in group.possible_cells):
-            self.field_state.set_state(cell, value)
-            intersection_length = len(self.field_state.get_involved(cell))
-            self.field_state.set_state(cell, 0)
-
-            if intersection_length <= value:
-                group.add_connection(cell)
-                self._add_possible_value(cell, value)
-            return True
-
-        return False
-
     def _try_fill_empty_cells(self):
         filled_cells = []
         prev_cell = None
-        free_cells = list(filter(lambda c: self.field_state.get_state(c) == 0,
-                                 self.field_state.field.get_all_cells()))
+        free_cells = self.field_state.field.order_cells(
+            self.field_state.get_empty_cells())
         possible_values = self.possible_values
 
         while free_cells:
@@ -517,14 +1532,21 @@ class PuzzleSolver:
             wrong_values = set()
 
             for value in possible_values[cell]:
+                self._count_node()
+                self._trace_event(SearchTrace.DECISION, cell, value,
+                                  len(filled_cells) + 1)
                 self.field_state.set_state(cell, value)
                 try:
                     self._check_group_size()
+                    self._trace_event(SearchTrace.PROPAGATED, cell, value,
+                                      len(filled_cells) + 1)
                     filled_cells.append(cell)
                     prev_cell = None
                     break
 
                 except ValueError:
+                    self._trace_event(SearchTrace.CONFLICT, cell, value,
+                                      len(filled_cells) + 1)
                     wrong_values.add(value)
 
             possible_values[cell] = list(
@@ -534,6 +1556,8 @@ class PuzzleSolver:
                 free_cells.append(cell)
                 if not filled_cells:
                     raise ValueError('Puzzle is unsolvable')
+                self._trace_event(SearchTrace.BACKTRACK, filled_cells[-1],
+                                  0, len(filled_cells))
                 prev_cell = filled_cells.pop()
                 possible_values[prev_cell] = list(
                     set(possible_values[prev_cell])
@@ -541,9 +1565,1252 @@ class PuzzleSolver:
                 self.field_state.set_state(cell, 0)
                 self.field_state.set_state(prev_cell, 0)
 
+        self._trace_event(SearchTrace.SOLVED, (0, 0), 0, len(filled_cells))
+
+    def _count_node(self):
+        self.nodes += 1
+        if self.budget is not None and self.nodes > self.budget:
+            raise BudgetExceededError('Search budget exceeded')
+
+    def _trace_event(self, event, cell, value, depth):
+        if self.trace is not None:
+            self.trace.record(event, cell, value, depth)
+
     def _check_group_size(self):
         self._refresh_state()
         if any(group.get_possible_length() < group.get_value()
                and not group.possible_connection_cells
                for group in self.unfilled_groups.values()):
             raise ValueError('Wrong group size')
+
+
+class LargePuzzleSolver(PuzzleSolver):
+    def __init__(self, string_state, unity=False, strict=False,
+                 max_value=None, budget=None, probe_budget=None):
+        super().__init__(string_state, unity, strict, max_value, budget,
+                         probe_budget)
+        self.field_state.track_changes()
+        self._initialized = False
+        self._groups_reads = {}
+        self._readers = {}
+        self._contributors = {}
+        self._regions_values = {}
+        self._oversized_groups = {}
+        self._broken_groups = set()
+        self._wiped_cells = set()
+        self._filled_cells = []
+        self._level = 0
+        self._levels = {}
+        self._reasons = {}
+        self._region_values = frozenset(range(2, self.max_value + 1))
+
+    def solve(self):
+        with memory_phase(self.profiler, 'propagate'):
+            self._refresh_state()
+            self._propagate()
+            self._check_feasibility()
+
+        with memory_phase(self.profiler, 'search'):
+            self._try_fill_empty_cells()
+
+    def _propagate(self):
+        while self._queue:
+            item = heapq.heappop(self._queue)[-1]
+            deduction = self._deduction(item)
+            if deduction is not None:
+                group = item if isinstance(item, CellsGroup) else None
+                self._fill_cells(deduction.cells, deduction.value, group)
+
+    def _refresh_state(self):
+        field = self.field_state.field
+
+        if self._initialized:
+            changed = set(self.field_state.pop_changes())
+        else:
+            self.field_state.pop_changes()
+            changed = set(field.get_all_cells())
+            self._initialized = True
+
+        touched = set(changed)
+        for cell in changed:
+            touched.update(field.get_neighbour_cells(cell))
+
+        dropped = set()
+        for cell in touched:
+            if cell in self.unfilled_groups:
+                dropped.add(self.unfilled_groups[cell])
+        for cell in changed:
+            dropped.update(self._readers.get(cell, ()))
+
+        updated = set(touched)
+        regrouped = set(touched)
+        for group in dropped:
+            updated.update(self._drop_group(group))
+            regrouped.update(group.initial_cells)
+
+        for cell in touched:
+            if cell in self._oversized_groups:
+                for group_cell in self._oversized_groups[cell]:
+                    del self._oversized_groups[group_cell]
+                    regrouped.add(group_cell)
+
+        new_groups = self._find_groups(regrouped)
+        for group in new_groups:
+            updated.update(self._add_group(group))
+
+        if not self.strict:
+            updated.update(self._refresh_regions(touched))
+
+        for cell in updated:
+            self._rebuild_possible_values(cell)
+
+        for cell in changed:
+            if self.field_state.get_state(cell) != 0:
+                self._filled_cells.append(cell)
+                if self._level:
+                    self._levels[cell] = self._level
+        self._schedule(new_groups)
+        self._schedule(updated)
+
+        if self._oversized_groups:
+            raise ValueError('Wrong group size')
+
+    def _find_groups(self, cells):
+        groups = []
+        involved = set()
+
+        for cell in sorted(cells):
+            value = self.field_state.get_state(cell)
+            if value == 0 or cell in involved:
+                continue
+
+            initial_cells = self.field_state.get_involved(cell)
+            involved.update(initial_cells)
+
+            if len(initial_cells) < value:
+                groups.append(CellsGroup(value, initial_cells))
+            elif len(initial_cells) > value:
+                for group_cell in initial_cells:
+                    self._oversized_groups[group_cell] = initial_cells
+
+        return groups
+
+    def _add_group(self, group):
+        for cell in group.initial_cells:
+            self.unfilled_groups[cell] = group
+
+        reads = self._find_group_cells(group)
+        self._groups_reads[group] = reads
+        for cell in reads:
+            self._readers.setdefault(cell, set()).add(group)
+
+        contributed = group.possible_cells + group.possible_connection_cells
+        for cell in contributed:
+            self._contributors.setdefault(cell, set()).add(group)
+
+        if (group.get_possible_length() < group.get_value()
+                and not group.possible_connection_cells):
+            self._broken_groups.add(group)
+
+        return contributed
+
+    def _find_group_cells(self, group):
+        read_cells = self._find_possible_values(group)
+        reads = set(read_cells)
+        for cell in read_cells:
+            reads.update(self.field_state.field.get_neighbour_cells(cell))
+        return reads
+
+    def _drop_group(self, group):
+        for cell in group.initial_cells:
+            if self.unfilled_groups.get(cell) is group:
+                del self.unfilled_groups[cell]
+
+        for cell in self._groups_reads.pop(group):
+            self._discard_from(self._readers, cell, group)
+
+        contributed = group.possible_cells + group.possible_connection_cells
+        for cell in contributed:
+            self._discard_from(self._contributors, cell, group)
+
+        self._broken_groups.discard(group)
+        return contributed
+
+    @staticmethod
+    def _discard_from(index, cell, group):
+        groups = index[cell]
+        groups.discard(group)
+        if not groups:
+            del index[cell]
+
+    def _refresh_regions(self, touched):
+        previous_values = {}
+        for cell in touched:
+            previous_values[cell] = self._regions_values.pop(cell, None)
+
+        updated = set()
+        for cell in sorted(touched):
+            if self.field_state.get_state(cell) != 0 or cell in updated:
+                continue
+
+            region, values = self._explore_empty_region(cell, True)
+            if values == self._region_values:
+                self._regions_values[cell] = values
+                updated.add(cell)
+                if previous_values[cell] in (None, self._region_values):
+                    continue
+                region, values = self._explore_empty_region(cell, False)
+
+            for region_cell in region:
+                self._regions_values[region_cell] = values
+            updated.update(region)
+
+        return updated
+
+    def _explore_empty_region(self, cell, bounded):
+        region = {cell}
+        not_checked = [cell]
+        checked = 0
+        blocked_cells = collections.Counter()
+        capacity_needed = self.max_value
+
+        while not_checked:
+            cell = not_checked.pop()
+            checked += 1
+            neighbour_values = self.field_state.get_neighbour_values(cell)
+
+            if 0 in neighbour_values:
+                for neighbour in self.field_state.field.get_neighbour_cells(
+                        cell):
+                    if (neighbour not in region
+                            and self.field_state.get_state(neighbour) == 0):
+                        region.add(neighbour)
+                        not_checked.append(neighbour)
+
+            for value in neighbour_values:
+                blocked_cells[value] += 1
+                if 2 <= value <= self.max_value:
+                    capacity_needed = max(capacity_needed,
+                                          value + blocked_cells[value])
+
+            if bounded and checked >= capacity_needed:
+                return region, self._region_values
+
+        return region, frozenset(
+            v for v in range(2, min(checked, self.max_value) + 1)
+            if checked - blocked_cells[v] >= v)
+
+    def _rebuild_possible_values(self, cell):
+        if self.field_state.get_state(cell) != 0:
+            self.possible_values.pop(cell, None)
+            self._wiped_cells.discard(cell)
+            return
+
+        values = {group.get_value()
+                  for group in self._contributors.get(cell, ())}
+        neighbour_values = self.field_state.get_neighbour_values(cell)
+
+        if self.unity and 1 not in neighbour_values:
+            values.add(1)
+        if not self.strict:
+            values.update(self._regions_values[cell] - neighbour_values)
+        values.difference_update(self._excluded_values.get(cell, ()))
+
+        self.possible_values[cell] = sorted(values)
+        if values:
+            self._wiped_cells.discard(cell)
+        else:
+            self._wiped_cells.add(cell)
+
+    def _fill_cells(self, cells, value, group=None):
+        if self._level:
+            if group is None:
+                reasons = self._domain_reasons(cells[0])
+            else:
+                reasons = self._group_reasons(group)
+            reasons = self._explanation_cells(reasons, self._level)
+            for cell in cells:
+                self._reasons[cell] = reasons
+
+        for cell in cells:
+            self.field_state.set_state(cell, value)
+        self._refresh_state()
+
+    def _try_fill_empty_cells(self):
+        if not self._state_consistent():
+            raise ValueError('Puzzle is unsolvable')
+
+        cells = self.field_state.field.get_all_cells()
+        decisions = []
+        index = 0
+
+        while True:
+            while (index < len(cells)
+                   and self.field_state.get_state(cells[index]) != 0):
+                index += 1
+            if index == len(cells):
+                self._trace_event(SearchTrace.SOLVED, (0, 0), 0,
+                                  len(decisions))
+                return
+
+            decisions.append([
+                index, self._ordered_values(cells[index]), [],
+                self._explanation_cells(
+                    self._domain_reasons(cells[index]), len(decisions) + 1)])
+
+            while not self._value_chosen(cells, decisions):
+                self._trace_event(SearchTrace.BACKTRACK,
+                                  cells[decisions[-1][0]], 0, len(decisions))
+                conflicts = decisions.pop()[3]
+                if not conflicts:
+                    raise ValueError('Puzzle is unsolvable')
+
+                level = max(self._levels[cell] for cell in conflicts)
+                while len(decisions) > level:
+                    self._trace_event(SearchTrace.BACKTRACK,
+                                      cells[decisions[-1][0]], 0,
+                                      len(decisions))
+                    self._undo(decisions.pop()[2])
+                decisions[-1][3].update(
+                    self._explanation_cells(conflicts, level))
+            index = decisions[-1][0]
+
+    def _ordered_values(self, cell):
+        adjacent_values = set()
+        for neighbour in self.field_state.field.get_neighbour_cells(cell):
+            if neighbour in self.unfilled_groups:
+                adjacent_values.add(self.unfilled_groups[neighbour].value)
+        contributed_values = {group.get_value()
+                              for group in self._contributors.get(cell, ())}
+
+        return sorted(self.possible_values[cell],
+                      key=lambda v: (v not in adjacent_values,
+                                     v not in contributed_values, v))
+
+    def _value_chosen(self, cells, decisions):
+        index, values, filled_cells, conflicts = decisions[-1]
+        level = len(decisions)
+
+        while values:
+            self._count_node()
+            self._undo(filled_cells)
+            self._level = level
+            self._filled_cells = filled_cells
+            value = values.pop(0)
+            self._trace_event(SearchTrace.DECISION, cells[index], value,
+                              level)
+            self.field_state.set_state(cells[index], value)
+            if self._state_consistent():
+                self._trace_event(SearchTrace.PROPAGATED, cells[index], value,
+                                  level)
+                return True
+            self._trace_event(SearchTrace.CONFLICT, cells[index], value,
+                              level)
+            conflicts.update(self._conflict_cells(level))
+
+        self._undo(filled_cells)
+        self.field_state.set_state(cells[index], 0)
+        return False
+
+    def _undo(self, filled_cells):
+        for cell in filled_cells:
+            self.field_state.set_state(cell, 0)
+            self._levels.pop(cell, None)
+            self._reasons.pop(cell, None)
+        del filled_cells[:]
+
+    def _state_consistent(self):
+        try:
+            self._refresh_state()
+            self._propagate()
+        except ValueError:
+            del self._queue[:]
+            return False
+
+        if self._broken_groups or self._wiped_cells:
+            del self._queue[:]
+            return False
+        return True
+
+    def _conflict_cells(self, level):
+        explanations = [self._group_reasons(g) for g in self._broken_groups]
+        explanations.extend(self._oversized_groups.values())
+        explanations.extend(self._domain_reasons(c) for c in self._wiped_cells)
+
+        return min((self._explanation_cells(e, level) for e in explanations),
+                   key=lambda cells: max(map(self._levels.get, cells),
+                                         default=0))
+
+    def _explanation_cells(self, cells, level):
+        explanation = set()
+        for cell in cells:
+            cell_level = self._levels.get(cell)
+            if cell_level is None:
+                continue
+            if cell_level < level:
+                explanation.add(cell)
+            else:
+                explanation.update(self._reasons.get(cell, ()))
+
+        return explanation
+
+    def _group_reasons(self, group):
+        return self._groups_reads[group].union(group.initial_cells)
+
+    def _domain_reasons(self, cell):
+        field = self.field_state.field
+        reasons = set(field.get_neighbour_cells(cell))
+
+        for value in range(1 if self.unity else 2, self.max_value + 1):
+            if value not in self.possible_values[cell]:
+                reasons.update(self._value_reasons(cell, value))
+
+        if (not self.strict
+                and self._regions_values.get(cell) != self._region_values):
+            region, _ = self._explore_empty_region(cell, False)
+            for region_cell in region:
+                reasons.update(field.get_neighbour_cells(region_cell))
+
+        return reasons
+
+    def _value_reasons(self, cell, value):
+        field = self.field_state.field
+        reasons = set()
+        distances = {cell: 0}
+        next_cells = collections.deque([cell])
+
+        while next_cells:
+            current_cell = next_cells.popleft()
+            if distances[current_cell] == value - 1:
+                continue
+
+            for neighbour in field.get_neighbour_cells(current_cell):
+                if neighbour in distances:
+                    continue
+                reasons.add(neighbour)
+
+                state = self.field_state.get_state(neighbour)
+                if state == value:
+                    group = self.unfilled_groups.get(neighbour)
+                    if group is not None:
+                        reasons.update(self._group_reasons(group))
+                    else:
+                        for group_cell in self.field_state.get_involved(
+                                neighbour):
+                            reasons.update(
+                                field.get_neighbour_cells(group_cell))
+                if state in (0, value):
+                    distances[neighbour] = distances[current_cell] + 1
+                    next_cells.append(neighbour)
+
+        return reasons
+
+    def _check_group_size(self):
+        self._refresh_state()
+        if self._broken_groups:
+            raise ValueError('Wrong group size')
+
+
+class BitboardPuzzleSolver(LargePuzzleSolver):
+    STATE_CLASS = BitboardFieldState
+
+
+class HintSession(LargePuzzleSolver):
+    def __init__(self, string_state, unity=False, strict=False,
+                 max_value=None):
+        super().__init__(string_state, unity, strict, max_value)
+        self._refresh_state()
+
+    def set_cell(self, cell, value):
+        if cell not in self.field_state.field:
+            raise ValueError('Cell {} is outside the field'.format(cell))
+        self.field_state.set_state(cell, value)
+        self._refresh_state()
+
+    def apply_hint(self, hint):
+        for cell in hint.cells:
+            self.field_state.set_state(cell, hint.value)
+        self._refresh_state()
+
+    def is_consistent(self):
+        return not (self._oversized_groups or self._broken_groups
+                    or self._wiped_cells)
+
+    def next_hint(self):
+        while self._queue:
+            deduction = self._deduction(self._queue[0][-1])
+            if deduction is not None:
+                return deduction
+            heapq.heappop(self._queue)
+
+        return None
+
+
+class UniquenessSession(LargePuzzleSolver):
+    def __init__(self, solver, clues=None, budget=None):
+        if not isinstance(solver, LargePuzzleSolver):
+            raise TypeError('Session should be built from LargePuzzleSolver')
+
+        solver.field_state.check_solution()
+        field = solver.field_state.field
+        self.__dict__.update(copy.deepcopy(solver.__dict__, {
+            id(field): field, id(solver.profiler): None,
+            id(solver.trace): None,
+            id(solver._queue_order): itertools.count(
+                next(solver._queue_order))}))
+        self.solution = copy.deepcopy(self.field_state, {id(field): field})
+        self.budget = budget
+        self.nodes = 0
+        self.alternative = None
+        self.clues = frozenset()
+        if clues is None:
+            clues = field.get_all_cells()
+        self.add_clues(clues)
+
+    def puzzle(self):
+        puzzle = FieldState(self.field_state.field)
+        for cell in self.field_state.field.get_all_cells():
+            if cell in self.clues:
+                puzzle.set_state(cell, self.solution.get_state(cell))
+            else:
+                puzzle.set_state(cell, 0)
+        return puzzle
+
+    def add_clues(self, clues):
+        if not isinstance(clues, dict):
+            clues = dict.fromkeys(clues)
+
+        for cell, value in clues.items():
+            if cell not in self.solution.field:
+                raise ValueError('Cell {} is outside the field'.format(cell))
+            if value is not None and value != self.solution.get_state(cell):
+                raise ValueError('Clue {} of value {} differs from solution '
+                                 'value {}'.format(
+                                     cell, value,
+                                     self.solution.get_state(cell)))
+        self.clues = self.clues.union(clues)
+
+    def remove_clues(self, cells):
+        cells = sorted(self.clues.intersection(cells))
+        clues = self.clues.difference(cells)
+        self.alternative = None
+        if not self.unity and any(
+                self.solution.get_state(cell) == 1 for cell in cells):
+            return False
+
+        if not self._restore(
+                {cell: self.solution.get_state(cell) if cell in clues else 0
+                 for cell in self.field_state.field.get_all_cells()}):
+            return False
+        base = dict(self.field_state.get_full_state())
+
+        for cell in cells:
+            if base[cell] != 0:
+                continue
+
+            self._excluded_values[cell].add(self.solution.get_state(cell))
+            try:
+                self._rebuild_possible_values(cell)
+                self._schedule([cell])
+                self._try_fill_empty_cells()
+                self.alternative = FieldState.from_string_to_state(
+                    str(self.field_state))
+            except ValueError:
+                pass
+            finally:
+                del self._excluded_values[cell]
+                self._restore(base)
+                self._rebuild_possible_values(cell)
+
+            if self.alternative is not None:
+                return False
+
+        self.clues = clues
+        return True
+
+    def _restore(self, state):
+        self._level = 0
+        self._levels.clear()
+        self._reasons.clear()
+        self._filled_cells = []
+
+        for cell, value in state.items():
+            if self.field_state.get_state(cell) != value:
+                self.field_state.set_state(cell, value)
+        return self._state_consistent()
+
+    def _ordered_values(self, cell):
+        return sorted(super()._ordered_values(cell),
+                      key=lambda v: v != self.solution.get_state(cell))
+
+    def _excluded_cells(self):
+        return {cell for cell, values in self._excluded_values.items()
+                if self.field_state.get_state(cell) in values}
+
+    def _state_consistent(self):
+        return super()._state_consistent() and not self._excluded_cells()
+
+    def _conflict_cells(self, level):
+        excluded_cells = self._excluded_cells()
+        if excluded_cells:
+            return self._explanation_cells(excluded_cells, level)
+        return super()._conflict_cells(level)
+
+
+UNIQUENESS_BUDGET = 1000
+
+
+def is_unique(puzzle, solution, unity=False, strict=False, max_value=None,
+              budget=UNIQUENESS_BUDGET):
+    session = UniquenessSession(
+        HintSession(str(solution), unity, strict, max_value), budget=budget)
+    try:
+        return session.remove_clues(puzzle.get_empty_cells())
+    except BudgetExceededError:
+        return None
+
+
+class DancingLinks:
+    def __init__(self, columns_count, primary_count, rows):
+        nodes = range(columns_count + 1)
+        self.left = list(nodes)
+        self.right = list(nodes)
+        self.up = list(nodes)
+        self.down = list(nodes)
+        self.column = list(nodes)
+        self.row = [None] * (columns_count + 1)
+        self.sizes = [0] * (columns_count + 1)
+
+        for column in range(1, primary_count + 1):
+            self.left[column] = self.left[0]
+            self.right[column] = 0
+            self.right[self.left[0]] = column
+            self.left[0] = column
+
+        for row_index, columns in enumerate(rows):
+            first = None
+            for column in columns:
+                node = len(self.column)
+                self.column.append(column)
+                self.row.append(row_index)
+                self.up.append(self.up[column])
+                self.down.append(column)
+                self.down[self.up[column]] = node
+                self.up[column] = node
+                self.sizes[column] += 1
+
+                if first is None:
+                    first = node
+                    self.left.append(node)
+                    self.right.append(node)
+                else:
+                    self.left.append(self.left[first])
+                    self.right.append(first)
+                    self.right[self.left[first]] = node
+                    self.left[first] = node
+
+    def search(self, count_node=None):
+        chosen = []
+        if self.right[0] == 0:
+            return chosen
+
+        column = self._smallest_column()
+        self._cover(column)
+        node = self.down[column]
+
+        while True:
+            if node != column:
+                if count_node is not None:
+                    count_node()
+                chosen.append(node)
+                self._cover_row(node)
+                if self.right[0] == 0:
+                    return [self.row[n] for n in chosen]
+
+                column = self._smallest_column()
+                self._cover(column)
+                node = self.down[column]
+                continue
+
+            self._uncover(column)
+            if not chosen:
+                return None
+
+            node = chosen.pop()
+            self._uncover_row(node)
+            column = self.column[node]
+            node = self.down[node]
+
+    def _smallest_column(self):
+        column = self.right[0]
+        smallest = column
+        while column != 0:
+            if self.sizes[column] < self.sizes[smallest]:
+                smallest = column
+                if not self.sizes[column]:
+                    break
+            column = self.right[column]
+        return smallest
+
+    def _cover_row(self, node):
+        other = self.right[node]
+        while other != node:
+            self._cover(self.column[other])
+            other = self.right[other]
+
+    def _uncover_row(self, node):
+        other = self.left[node]
+        while other != node:
+            self._uncover(self.column[other])
+            other = self.left[other]
+
+    def _cover(self, column):
+        self.left[self.right[column]] = self.left[column]
+        self.right[self.left[column]] = self.right[column]
+
+        row_node = self.down[column]
+        while row_node != column:
+            node = self.right[row_node]
+            while node != row_node:
+                self.down[self.up[node]] = self.down[node]
+                self.up[self.down[node]] = self.up[node]
+                self.sizes[self.column[node]] -= 1
+                node = self.right[node]
+            row_node = self.down[row_node]
+
+    def _uncover(self, column):
+        row_node = self.up[column]
+        while row_node != column:
+            node = self.left[row_node]
+            while node != row_node:
+                self.sizes[self.column[node]] += 1
+                self.down[self.up[node]] = node
+                self.up[self.down[node]] = node
+                node = self.left[node]
+            row_node = self.up[row_node]
+
+        self.left[self.right[column]] = column
+        self.right[self.left[column]] = column
+
+
+class ExactCoverSolver(PuzzleSolver):
+    SHAPES_CACHE_BYTES = 32 * 2 ** 20
+    AXIAL_DIRECTIONS = ((0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1))
+    _shapes_cache = {}
+    _shapes_lock = threading.Lock()
+
+    def __init__(self, string_state, unity=False, strict=False,
+                 max_value=None, budget=None, probe_budget=None):
+        super().__init__(string_state, unity, strict, max_value, budget,
+                         probe_budget)
+        field = self.field_state.field
+        self._axial_cells = {field.get_axial(c): c
+                             for c in field.get_all_cells()}
+
+    def solve(self):
+        with memory_phase(self.profiler, 'propagate'):
+            placements = self._find_placements()
+            links = self._build_links(placements)
+
+        with memory_phase(self.profiler, 'search'):
+            solution = links.search(self._count_node)
+            if solution is None:
+                raise ValueError('Puzzle is unsolvable')
+
+            for row in solution:
+                value, placement = placements[row]
+                for cell in placement:
+                    self.field_state.set_state(cell, value)
+
+    def _build_links(self, placements):
+        field = self.field_state.field
+        cell_columns = {cell: column for column, cell
+                        in enumerate(field.get_all_cells(), 1)}
+        edge_columns = {}
+        rows = []
+
+        for value, placement in placements:
+            columns = [cell_columns[cell] for cell in placement]
+            edges = set()
+            for cell in placement:
+                for neighbour in field.get_neighbour_cells(cell):
+                    edges.add((min(cell, neighbour), max(cell, neighbour),
+                               value))
+            for edge in edges:
+                if edge not in edge_columns:
+                    edge_columns[edge] = (len(cell_columns)
+                                          + len(edge_columns) + 1)
+                columns.append(edge_columns[edge])
+            rows.append(columns)
+
+        return DancingLinks(len(cell_columns) + len(edge_columns),
+                            len(cell_columns), rows)
+
+    def _find_placements(self):
+        field = self.field_state.field
+        state = self.field_state.get_full_state()
+        placements = []
+
+        for cell in field.get_all_cells():
+            if state[cell] == 1 or self.unity and state[cell] == 0:
+                if self._placement_valid((cell,), 1, state):
+                    placements.append((1, (cell,)))
+
+        for value in range(2, self.max_value + 1):
+            allowed = [c for c in field.get_all_cells()
+                       if state[c] in (0, value)]
+            clues = [c for c in allowed if state[c] == value]
+            allowed_set = set(allowed)
+
+            for root in allowed:
+                if self.strict and not any(
+                        field.get_distance(root, c) < value for c in clues):
+                    continue
+
+                for placement in self._grown_placements(root, value,
+                                                        allowed_set):
+                    if self._placement_valid(placement, value, state):
+                        placements.append((value, placement))
+
+        return placements
+
+    def _placement_valid(self, placement, value, state):
+        if self.strict and value > 1 and not any(state[c] for c in placement):
+            return False
+
+        for cell in placement:
+            for neighbour in self.field_state.field.get_neighbour_cells(cell):
+                if state[neighbour] == value and neighbour not in placement:
+                    return False
+
+        return True
+
+    def _grown_placements(self, root, value, allowed):
+        shapes = self._shape_tree(value)
+        if shapes is None:
+            return self._grown_area_placements(root, value, allowed)
+
+        offsets_q, offsets_r, levels, skips = shapes
+        root_q, root_r = self.field_state.field.get_axial(root)
+        axial_cells = self._axial_cells
+        placements = []
+        placement = []
+        node = 0
+
+        while node < skips[0]:
+            level = levels[node]
+            cell = axial_cells.get((root_q + offsets_q[node],
+                                    root_r + offsets_r[node]))
+            if cell is None or cell not in allowed:
+                node = skips[node]
+                continue
+
+            del placement[level - 1:]
+            placement.append(cell)
+            if level == value:
+                placements.append(tuple(placement))
+                node = skips[node]
+            else:
+                node += 1
+
+        return placements
+
+    def _shape_tree(self, value):
+        with self._shapes_lock:
+            for depth, shapes in self._shapes_cache.items():
+                if shapes is None and depth <= value:
+                    return None
+                if shapes is not None and depth >= value:
+                    return shapes
+
+            shapes = self._build_shape_tree(value)
+            if shapes is not None:
+                self._shapes_cache.clear()
+            self._shapes_cache[value] = shapes
+            return shapes
+
+    def _build_shape_tree(self, depth):
+        shapes = tuple(array.array('i') for _ in range(4))
+        max_nodes = self.SHAPES_CACHE_BYTES // sum(a.itemsize for a in shapes)
+        offsets_q, offsets_r, levels, skips = shapes
+
+        def grow(offset, level, untried, seen):
+            node = len(levels)
+            if node >= max_nodes:
+                return False
+            offsets_q.append(offset[0])
+            offsets_r.append(offset[1])
+            levels.append(level)
+            skips.append(0)
+
+            if level < depth:
+                untried = list(untried)
+                while untried:
+                    cell = untried.pop()
+                    new_cells = [n for n in self._axial_neighbours(cell)
+                                 if n not in seen]
+                    if not grow(cell, level + 1, untried + new_cells,
+                                seen.union(new_cells)):
+                        return False
+
+            skips[node] = len(levels)
+            return True
+
+        untried = self._axial_neighbours((0, 0))
+        if not grow((0, 0), 1, untried, set(untried).union([(0, 0)])):
+            return None
+        return shapes
+
+    def _axial_neighbours(self, offset):
+        q, r = offset
+        return [(q + dq, r + dr) for dq, dr in self.AXIAL_DIRECTIONS
+                if (r + dr, q + dq) > (0, 0)]
+
+    def _grown_area_placements(self, root, value, allowed):
+        field = self.field_state.field
+        area = frozenset(c for c in allowed
+                         if c > root and field.get_distance(root, c) < value)
+        untried = [n for n in field.get_neighbour_cells(root) if n in area]
+        return list(self._grow([root], untried, set(untried).union([root]),
+                               value, area))
+
+    def _grow(self, placement, untried, seen, value, area):
+        if len(placement) == value:
+            yield tuple(placement)
+            return
+
+        untried = list(untried)
+        while untried:
+            cell = untried.pop()
+            new_cells = [n for n in self.field_state.field.get_neighbour_cells(
+                         cell) if n in area and n not in seen]
+            placement.append(cell)
+            yield from self._grow(placement, untried + new_cells,
+                                  seen.union(new_cells), value, area)
+            placement.pop()
+
+
+SolverResult = collections.namedtuple(
+    'SolverResult',
+    ['backend', 'solution', 'nodes', 'seconds', 'error', 'out_of_budget'])
+
+SOLVER_BACKENDS = {}
+DEFAULT_BACKEND = 'simple'
+
+
+def register_backend(name, backend):
+    SOLVER_BACKENDS[name] = backend
+
+
+def solver_backend(solver_class):
+    def solve(string_state, unity=False, strict=False, budget=None,
+              max_value=None, profiler=None, trace=None, probe_budget=None):
+        start = time.perf_counter()
+        solver = solver_class(string_state, unity, strict, max_value, budget,
+                              probe_budget)
+        solver.profiler = profiler
+        solver.trace = trace
+        solution = error = None
+        out_of_budget = False
+
+        try:
+            solver.solve()
+            solution = str(solver.field_state)
+        except BudgetExceededError as e:
+            error = str(e)
+            out_of_budget = True
+        except ValueError as e:
+            error = str(e)
+
+        return SolverResult(None, solution, solver.nodes,
+                            time.perf_counter() - start, error, out_of_budget)
+
+    return solve
+
+
+def solve_with_backend(name, string_state, unity=False, strict=False,
+                       budget=None, max_value=None, profiler=None,
+                       trace=None, probe_budget=None):
+    if name not in SOLVER_BACKENDS:
+        raise ValueError('Unknown solver backend: {}'.format(name))
+
+    options = {}
+    if profiler is not None:
+        options['profiler'] = profiler
+    if trace is not None:
+        options['trace'] = trace
+    if probe_budget is not None:
+        options['probe_budget'] = probe_budget
+
+    result = SOLVER_BACKENDS[name](string_state, unity, strict, budget,
+                                   max_value, **options)
+    return result._replace(backend=name)
+
+
+def _race_backend(results, name, string_state, unity, strict, budget,
+                  max_value):
+    try:
+        results.put((solve_with_backend(name, string_state, unity, strict,
+                                        budget, max_value), False))
+    except Exception as e:
+        results.put((SolverResult(name, None, 0, 0.0, str(e), False), True))
+
+
+def race_backends(string_state, names=None, unity=False, strict=False,
+                  budget=None, max_value=None):
+    names = list(names or SOLVER_BACKENDS)
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(
+        target=_race_backend, daemon=True,
+        args=(results, name, string_state, unity, strict, budget, max_value))
+        for name in names]
+
+    for process in processes:
+        process.start()
+
+    try:
+        fallback = None
+        for _ in processes:
+            result, failed = results.get()
+            if not failed and not result.out_of_budget:
+                return result
+            if fallback is None or fallback[1] and not failed:
+                fallback = result, failed
+        return fallback[0]
+
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def compare_backends(puzzles, names=None, unity=False, strict=False,
+                     budget=None, max_value=None):
+    names = list(names or SOLVER_BACKENDS)
+    results = {name: [] for name in names}
+
+    for puzzle in puzzles:
+        for name in names:
+            results[name].append(solve_with_backend(
+                name, puzzle, unity, strict, budget, max_value))
+
+    return results
+
+
+register_backend('simple', solver_backend(PuzzleSolver))
+register_backend('large', solver_backend(LargePuzzleSolver))
+register_backend('bitboard', solver_backend(BitboardPuzzleSolver))
+register_backend('exact', solver_backend(ExactCoverSolver))
+
+
+def verify_solution(string_state, puzzle=None):
+    try:
+        solution = FieldState.from_string_to_state(string_state)
+        solution.check_solution()
+        if puzzle is not None:
+            puzzle = FieldState.from_string_to_state(puzzle)
+            if puzzle.field.size() != solution.field.size():
+                raise ValueError('Solution size differs from puzzle size')
+            for cell in puzzle.get_filled_cells():
+                if puzzle.get_state(cell) != solution.get_state(cell):
+                    raise ValueError('Clue {} changed from {} to {}'.format(
+                        cell, puzzle.get_state(cell),
+                        solution.get_state(cell)))
+    except ValueError as e:
+        return str(e)
+
+    return None
+
+
+def results_agree(puzzle, result, other_result):
+    if result.out_of_budget or other_result.out_of_budget:
+        return False
+    if result.solution is None or other_result.solution is None:
+        return result.solution is None and other_result.solution is None
+    return (verify_solution(result.solution, puzzle) is None
+            and verify_solution(other_result.solution, puzzle) is None)
+
+
+def iter_boards(lines):
+    rows = []
+    for line in lines:
+        if line.strip():
+            rows.append(line)
+        elif rows:
+            yield ''.join(rows)
+            rows = []
+
+    if rows:
+        yield ''.join(rows)
+
+
+def verify_solutions(boards, processes=None, chunksize=256):
+    processes = processes or multiprocessing.cpu_count()
+    batch_size = chunksize * processes * 4
+    boards = iter(boards)
+
+    with multiprocessing.Pool(processes) as pool:
+
+        while True:
+            batch = list(itertools.islice(boards, batch_size))
+            if not batch:
+                return
+            yield from pool.map(verify_solution, batch, chunksize)
+
+
+def _generate_puzzle(size, percent, unity, max_value, big, seed, adaptive,
+                     tolerance):
+    generator_class = LargePuzzleGenerator if big else PuzzleGenerator
+    generator = generator_class(size, max_value, seed, adaptive, tolerance)
+    generator.generate_filled_field()
+    generator.generate_field_for_game(unity, percent)
+    return generator
+
+
+def generate_many(count, size, percent=50, unity=False, max_value=9,
+                  big=False, seed=None, workers=None, adaptive=False,
+                  tolerance=0.05):
+    seeds = random.Random(seed)
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(
+            lambda task_seed: _generate_puzzle(size, percent, unity,
+                                               max_value, big, task_seed,
+                                               adaptive, tolerance),
+            [seeds.getrandbits(64) for _ in range(count)]))
+
+
+def solve_many(puzzles, unity=False, strict=False, backend=DEFAULT_BACKEND,
+               budget=None, max_value=None, workers=None):
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        return list(executor.map(
+            lambda puzzle: solve_with_backend(backend, puzzle, unity, strict,
+                                              budget, max_value),
+            puzzles))
+
+
+StoredPuzzle = collections.namedtuple(
+    'StoredPuzzle', ['id', 'puzzle', 'solution', 'size', 'max_value',
+                     'empty', 'unity', 'strict', 'hash', 'cost', 'unique'])
+
+
+class PuzzleStore:
+    BATCH_SIZE = 500
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS puzzles (
+            id INTEGER PRIMARY KEY,
+            size INTEGER NOT NULL,
+            max_value INTEGER NOT NULL,
+            empty REAL NOT NULL,
+            unity INTEGER NOT NULL,
+            strict INTEGER NOT NULL,
+            hash TEXT NOT NULL,
+            cost INTEGER,
+            is_unique INTEGER,
+            puzzle BLOB NOT NULL,
+            solution BLOB);
+        CREATE INDEX IF NOT EXISTS puzzles_shape
+            ON puzzles (size, max_value, unity, strict, empty);
+        CREATE INDEX IF NOT EXISTS puzzles_hash ON puzzles (hash);
+        CREATE INDEX IF NOT EXISTS puzzles_cost ON puzzles (size, cost);
+    '''
+
+    def __init__(self, filename):
+        self._connection = sqlite3.connect(filename)
+        self._connection.executescript(self.SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._connection.close()
+
+    def add(self, puzzle, solution=None, unity=False, strict=False,
+            max_value=None, cost=None, unique=None):
+        with self._connection:
+            return self._connection.execute(
+                self._insert_query(), self._row(
+                    puzzle, solution, unity, strict, max_value, cost,
+                    unique)).lastrowid
+
+    def add_many(self, records):
+        added = 0
+        records = iter(records)
+        while True:
+            batch = [self._row(*record)
+                     for record in itertools.islice(records, self.BATCH_SIZE)]
+            if not batch:
+                return added
+
+            with self._connection:
+                self._connection.executemany(self._insert_query(), batch)
+            added += len(batch)
+
+    def update(self, puzzle_id, solution=None, cost=None, unique=None):
+        with self._connection:
+            self._connection.execute(
+                'UPDATE puzzles SET solution = coalesce(solution, ?), '
+                'cost = coalesce(?, cost), '
+                'is_unique = coalesce(?, is_unique) WHERE id = ?',
+                (None if solution is None else solution.pack(), cost,
+                 unique, puzzle_id))
+
+    def query(self, size=None, max_value=None, min_empty=None,
+              max_empty=None, unity=None, strict=None, puzzle_hash=None,
+              max_cost=None, unique=None, limit=None):
+        conditions = []
+        parameters = []
+        for condition, value in (('size = ?', size),
+                                 ('max_value = ?', max_value),
+                                 ('empty >= ?', min_empty),
+                                 ('empty <= ?', max_empty),
+                                 ('unity = ?', unity),
+                                 ('strict = ?', strict),
+                                 ('hash = ?', puzzle_hash),
+                                 ('cost <= ?', max_cost),
+                                 ('is_unique = ?', unique)):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+
+        query = ('SELECT id, puzzle, solution, size, max_value, empty, '
+                 'unity, strict, hash, cost, is_unique FROM puzzles')
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+
+        for row in self._connection.execute(query, parameters):
+            yield StoredPuzzle(
+                row[0], FieldState.unpack(row[1]),
+                None if row[2] is None else FieldState.unpack(row[2]),
+                row[3], row[4], row[5], bool(row[6]), bool(row[7]), row[8],
+                row[9], None if row[10] is None else bool(row[10]))
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT count(*) FROM puzzles').fetchone()[0]
+
+    @staticmethod
+    def _insert_query():
+        return ('INSERT INTO puzzles (size, max_value, empty, unity, strict, '
+                'hash, cost, is_unique, puzzle, solution) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+    @staticmethod
+    def _row(puzzle, solution=None, unity=False, strict=False,
+             max_value=None, cost=None, unique=None):
+        cells = puzzle.field.get_all_cells()
+        empty = len(puzzle.get_empty_cells())
+        if max_value is None:
+            max_value = max([9] + [
+                (solution or puzzle).get_state(cell) for cell in cells])
+
+        return (puzzle.field.size(), max_value,
+                round(100 * empty / len(cells), 2), bool(unity),
+                bool(strict), puzzle.canonical_hash(), cost, unique,
+                puzzle.pack(), None if solution is None else solution.pack())
@@ -5,6 +5,7 @@ ERROR_MODULES_MISSING = 2
 ERROR_SOLVING_PUZZLE = 3
 ERROR_READING_FROM_FILE = 4
 ERROR_WRITING_TO_FILE = 5
+ERROR_INVALID_SOLUTIONS = 6
 
 import sys
 import os
@@ -19,7 +20,13 @@ if sys.platform.startswith('win32'):
 import argparse
 
 try:
-    from fillomino_logic import PuzzleSolver
+    from fillomino_logic import (FieldState, SOLVER_BACKENDS, DEFAULT_BACKEND,
+                                 solve_with_backend, race_backends,
+                                 compare_backends, MemoryProfiler,
+                                 memory_phase, iter_boards, verify_solutions,
+                                 results_agree, verify_solution, is_unique,
+                                 UNIQUENESS_BUDGET,
+                                 SearchTrace, PuzzleStore)
 except Exception as e:
     print('Game modules not found: "{}"'.format(e), file=sys.stderr)
     sys.exit(ERROR_MODULES_MISSING)
@@ -51,19 +58,137 @@ def parse_args():
         '-r', '--strict', action="store_true", default=False,
         help='every block (except maybe "1") '
              'has at least one value on the field')
+    parser.add_argument(
+        '-b', '--big', action="store_true", default=False,
+        help='use solver for big fields')
+    parser.add_argument(
+        '-e', '--exact', action="store_true", default=False,
+        help='solve as exact cover of group placements')
+    parser.add_argument(
+        '-m', '--maxvalue', type=int,
+        metavar='MAXVALUE', help='maximum value of cell')
+    parser.add_argument(
+        '-k', '--backend', type=str, choices=sorted(SOLVER_BACKENDS),
+        help='solver backend (default: "{}")'.format(DEFAULT_BACKEND))
+    parser.add_argument(
+        '-n', '--budget', type=int,
+        metavar='NODES', help='maximum number of search nodes')
+    parser.add_argument(
+        '--probe-budget', type=int,
+        metavar='PROBES', help='maximum number of value probes '
+                               'before search')
+    parser.add_argument(
+        '-a', '--race', type=str, nargs='*', choices=sorted(SOLVER_BACKENDS),
+        metavar='BACKEND', help='run backends (default: all) in parallel '
+                                'processes and take the first answer')
+    parser.add_argument(
+        '-p', '--compare', type=str, nargs='+',
+        metavar='FILENAME', help='run every backend over puzzles from files '
+                                 'and print time, nodes and agreement')
+    parser.add_argument(
+        '-v', '--verify', type=str, nargs='+',
+        metavar='FILENAME', help='check solved boards from files '
+                                 'and print invalid ones')
+    parser.add_argument(
+        '-j', '--jobs', type=int,
+        metavar='JOBS', help='number of processes for verification')
+    parser.add_argument(
+        '-t', '--trace', type=str,
+        metavar='FILENAME', help='write search trace to file')
+    parser.add_argument(
+        '-i', '--inspect', type=str,
+        metavar='FILENAME', help='print summary of search trace from file')
+    parser.add_argument(
+        '-o', '--store', type=str,
+        metavar='FILENAME', help='add solved puzzle to puzzle store')
+    parser.add_argument(
+        '--check-unique', action="store_true", default=False,
+        help='check that stored puzzle has unique solution')
+    parser.add_argument(
+        '--unique-budget', type=int, default=UNIQUENESS_BUDGET,
+        metavar='NODES', help='maximum number of search nodes of uniqueness '
+                              'check (default: {})'.format(UNIQUENESS_BUDGET))
+    parser.add_argument(
+        '-q', '--query', action="store_true", default=False,
+        help='solve puzzles from store and save solutions and costs')
+    parser.add_argument(
+        '--size', type=int,
+        metavar='SIZE', help='size of puzzles from store')
+    parser.add_argument(
+        '--empty', type=float, nargs=2,
+        metavar=('MIN', 'MAX'), help='percent of empty cells '
+                                     'of puzzles from store')
+    parser.add_argument(
+        '--limit', type=int,
+        metavar='COUNT', help='maximum number of puzzles from store')
+    parser.add_argument(
+        '--profile-memory', action="store_true", default=False,
+        help='print memory usage of every phase to stderr')
 
     return parser.parse_args()
 
 
-def write_solution(puzzle, unity, filename, colored, strict):
+def get_backend(args):
+    if args.backend:
+        return args.backend
+    if args.exact:
+        return 'exact'
+    if args.big:
+        return 'large'
+    return DEFAULT_BACKEND
+
+
+def solve_puzzle(puzzle, unity, strict, backend, max_value, budget, race,
+                 profiler, trace_filename, probe_budget=None):
+    if race is not None:
+        return race_backends(puzzle, race, unity, strict, budget, max_value)
+
+    if trace_filename is None:
+        return solve_with_backend(backend, puzzle, unity, strict, budget,
+                                  max_value, profiler,
+                                  probe_budget=probe_budget)
+
+    with open(trace_filename, 'wb') as trace_file:
+        return solve_with_backend(backend, puzzle, unity, strict, budget,
+                                  max_value, profiler, SearchTrace(trace_file),
+                                  probe_budget)
+
+
+def write_solution(puzzle, unity, filename, colored, strict,
+                   backend=DEFAULT_BACKEND, max_value=None, budget=None,
+                   race=None, profile_memory=False, trace_filename=None,
+                   store=None, probe_budget=None, check_unique=False,
+                   unique_budget=UNIQUENESS_BUDGET):
+    profiler = MemoryProfiler() if profile_memory else None
     try:
-        solver = PuzzleSolver(puzzle, bool(unity), bool(strict))
-        solver.solve()
+        result = solve_puzzle(puzzle, bool(unity), bool(strict), backend,
+                              max_value, budget, race, profiler,
+                              trace_filename, probe_budget)
+        if result.error:
+            raise ValueError(result.error)
+        solution = FieldState.from_string_to_state(result.solution)
+
+        if store:
+            try:
+                puzzle_state = FieldState.from_string_to_state(puzzle)
+                unique = None
+                if check_unique:
+                    unique = is_unique(puzzle_state, solution, bool(unity),
+                                       bool(strict), max_value, unique_budget)
+                with PuzzleStore(store) as puzzle_store:
+                    puzzle_store.add(puzzle_state, solution, bool(unity),
+                                     bool(strict), max_value, result.nodes,
+                                     unique)
+
+            except Exception as e:
+                print('Error while writing to file\n{}'.format(e),
+                      file=sys.stderr)
+                sys.exit(ERROR_WRITING_TO_FILE)
 
         if filename:
             try:
                 with open(filename, 'w') as output_file:
-                    print(solver.field_state, file=output_file)
+                    print(solution, file=output_file)
 
             except Exception as e:
                 print('Error while writing to file\n{}'.format(e),
@@ -72,18 +197,188 @@ def write_solution(puzzle, unity, filename, colored, strict):
 
         else:
             if colored:
-                solver.field_state.color_state()
-            print(solver.field_state)
+                with memory_phase(profiler, 'colour'):
+                    solution.color_state()
+            print(solution)
 
     except Exception as e:
         print('Error while solving puzzle\n{}'.format(e),
               file=sys.stderr)
         sys.exit(ERROR_SOLVING_PUZZLE)
 
+    if profiler is not None:
+        print(profiler.report(), file=sys.stderr)
+
+
+def read_puzzles(filenames):
+    puzzles = []
+    for filename in filenames:
+        with open(filename, 'r') as input_file:
+            puzzles.extend(iter_boards(input_file))
+    return puzzles
+
+
+def print_comparison(puzzles, results):
+    names = list(results)
+    reference = results[DEFAULT_BACKEND if DEFAULT_BACKEND in results
+                        else names[0]]
+
+    print('{:<10}{:>8}{:>12}{:>10}{:>12}{:>12}{:>8}'.format(
+        'backend', 'solved', 'unsolvable', 'budget', 'time', 'nodes',
+        'agree'))
+    for name in names:
+        backend_results = results[name]
+        print('{:<10}{:>8}{:>12}{:>10}{:>12.3f}{:>12}{:>8}'.format(
+            name,
+            sum(r.solution is not None for r in backend_results),
+            sum(r.solution is None and not r.out_of_budget
+                for r in backend_results),
+            sum(r.out_of_budget for r in backend_results),
+            sum(r.seconds for r in backend_results),
+            sum(r.nodes for r in backend_results),
+            sum(results_agree(puzzle, r, ref) for puzzle, r, ref
+                in zip(puzzles, backend_results, reference))))
+
+
+def compare(filenames, unity, strict, max_value=None, budget=None):
+    try:
+        puzzles = read_puzzles(filenames)
+
+    except Exception as e:
+        print('Error while reading from file\n{}'.format(e),
+              file=sys.stderr)
+        sys.exit(ERROR_READING_FROM_FILE)
+
+    try:
+        print_comparison(puzzles, compare_backends(
+            puzzles, None, bool(unity), bool(strict), budget, max_value))
+
+    except Exception as e:
+        print('Error while solving puzzle\n{}'.format(e),
+              file=sys.stderr)
+        sys.exit(ERROR_SOLVING_PUZZLE)
+
+
+def verify(filenames, jobs=None):
+    checked = invalid = 0
+
+    for filename in filenames:
+        try:
+            with open(filename, 'r') as input_file:
+                for number, error in enumerate(verify_solutions(
+                        iter_boards(input_file), jobs), 1):
+                    checked += 1
+                    if error is not None:
+                        invalid += 1
+                        print('{}:{}: {}'.format(filename, number, error))
+
+        except Exception as e:
+            print('Error while reading from file\n{}'.format(e),
+                  file=sys.stderr)
+            sys.exit(ERROR_READING_FROM_FILE)
+
+    print('Checked {} boards, {} invalid'.format(checked, invalid))
+    if invalid:
+        sys.exit(ERROR_INVALID_SOLUTIONS)
+
+
+def solve_stored(filename, unity, strict, backend=DEFAULT_BACKEND,
+                 max_value=None, budget=None, size=None, empty=None,
+                 limit=None, unique_budget=UNIQUENESS_BUDGET):
+    min_empty, max_empty = empty or (None, None)
+    solved = 0
+
+    try:
+        with PuzzleStore(filename) as store:
+            for record in store.query(size, max_value, min_empty, max_empty,
+                                      bool(unity), bool(strict),
+                                      limit=limit):
+                result = solve_with_backend(
+                    backend, str(record.puzzle), record.unity,
+                    record.strict, budget, record.max_value)
+                if result.solution is None:
+                    print('{}: {}'.format(record.id, result.error))
+                    continue
+
+                solution = record.solution
+                if solution is None:
+                    solution = FieldState.from_string_to_state(
+                        result.solution)
+                else:
+                    error = verify_solution(result.solution,
+                                            str(record.puzzle))
+                    if error is not None:
+                        print('{}: {}'.format(record.id, error))
+                        continue
+
+                solved += 1
+                unique = record.unique
+                if unique is None:
+                    unique = is_unique(record.puzzle, solution, record.unity,
+                                       record.strict, record.max_value,
+                                       unique_budget)
+                store.update(record.id, solution, result.nodes, unique)
+                print('{}: solved, {} nodes, {:.3f} s, unique {}'.format(
+                    record.id, result.nodes, result.seconds, unique))
+
+    except Exception as e:
+        print('Error while reading from file\n{}'.format(e),
+              file=sys.stderr)
+        sys.exit(ERROR_READING_FROM_FILE)
+
+    print('Solved {} puzzles'.format(solved))
+
+
+def inspect(filename):
+    try:
+        with open(filename, 'rb') as input_file:
+            summary = SearchTrace.summarize(SearchTrace.read(input_file))
+
+    except Exception as e:
+        print('Error while reading from file\n{}'.format(e),
+              file=sys.stderr)
+        sys.exit(ERROR_READING_FROM_FILE)
+
+    print(', '.join('{} {}'.format(name, summary.events[name])
+                    for name in SearchTrace.EVENT_NAMES.values()))
+    print('max depth {}, total time {:.3f}'.format(summary.max_depth,
+                                                   summary.total_time))
+
+    print('{:>8}{:>10}{:>12}{:>12}'.format('depth', 'nodes', 'conflicts',
+                                           'time'))
+    for depth in sorted(summary.time_per_depth):
+        print('{:>8}{:>10}{:>12}{:>12.3f}'.format(
+            depth, summary.nodes_per_depth[depth],
+            summary.conflicts_per_depth[depth],
+            summary.time_per_depth[depth]))
+
+    print('conflicts by cell:')
+    for cell, conflicts in summary.conflicts_per_cell.most_common(10):
+        print('{:>12}{:>10}'.format(str(cell), conflicts))
+
 
 def main():
     args = parse_args()
 
+    if args.inspect:
+        inspect(args.inspect)
+        return
+
+    if args.verify:
+        verify(args.verify, args.jobs)
+        return
+
+    if args.query:
+        solve_stored(args.store, args.unity, args.strict, get_backend(args),
+                     args.maxvalue, args.budget, args.size, args.empty,
+                     args.limit, args.unique_budget)
+        return
+
+    if args.compare:
+        compare(args.compare, args.unity, args.strict, args.maxvalue,
+                args.budget)
+        return
+
     if not sys.stdin.isatty():
         try:
             puzzle = sys.stdin.read()
@@ -93,7 +388,11 @@ def main():
                   file=sys.stderr)
             sys.exit(ERROR_READING_FROM_FILE)
 
-        write_solution(puzzle, args.unity, args.write, args.color, args.strict)
+        write_solution(puzzle, args.unity, args.write, args.color, args.strict,
+                       get_backend(args), args.maxvalue, args.budget,
+                       args.race, args.profile_memory, args.trace,
+                       args.store, args.probe_budget, args.check_unique,
+                       args.unique_budget)
 
     if args.solve:
         try:
@@ -105,7 +404,11 @@ def main():
                   file=sys.stderr)
             sys.exit(ERROR_READING_FROM_FILE)
 
-        write_solution(puzzle, args.unity, args.write, args.color, args.strict)
+        write_solution(puzzle, args.unity, args.write, args.color, args.strict,
+                       get_backend(args), args.maxvalue, args.budget,
+                       args.race, args.profile_memory, args.trace,
+                       args.store, args.probe_budget, args.check_unique,
+                       args.unique_budget)
 
 
 if __name__ == '__main__':
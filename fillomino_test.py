@@ -1,12 +1,41 @@
 #!/usr/bin/env python3
 
+import copy
+import io
 import os
+import random
 import sys
+import time
+import tracemalloc
 import unittest
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              os.path.pardir))
-from fillomino_logic import Field, FieldState, PuzzleGenerator, PuzzleSolver
+from fillomino_logic import (Field, FieldState, BitboardFieldState,
+                             CellsGroup,
+                             PuzzleGenerator, PuzzleSolver,
+                             LargePuzzleGenerator, LargePuzzleSolver,
+                             HintSession, UniquenessSession,
+                             GeneratorStats,
+                             ExactCoverSolver, SOLVER_BACKENDS,
+                             register_backend, solver_backend,
+                             solve_with_backend, race_backends,
+                             compare_backends, MemoryProfiler, memory_phase,
+                             verify_solution, results_agree, iter_boards,
+                             verify_solutions,
+                             generate_many, solve_many, SearchTrace,
+                             TraceEvent, PuzzleStore, is_unique,
+                             KERNELS_COMPILED,
+                             _python_kernel, _involved_kernel,
+                             _check_groups_kernel, _expansion_kernel)
+
+
+def check_solution(test, puzzle_state, solution_state):
+    for cell in solution_state.field.get_all_cells():
+        value = solution_state.get_state(cell)
+        test.assertEqual(len(solution_state.get_involved(cell)), value)
+        if puzzle_state.get_state(cell) != 0:
+            test.assertEqual(puzzle_state.get_state(cell), value)
 
 
 class FieldTest(unittest.TestCase):
@@ -45,6 +74,34 @@ class FieldTest(unittest.TestCase):
             self.assertSetEqual(
                 neighbours, set(field.get_neighbour_cells(cell)))
 
+    def test_get_distance(self):
+        field = Field(3)
+
+        for cell in field.get_all_cells():
+            for neighbour in field.get_neighbour_cells(cell):
+                self.assertEqual(field.get_distance(cell, neighbour), 1)
+
+        for cell, other_cell, distance in (((0, 0), (0, 0), 0),
+                                           ((0, 0), (4, 2), 4),
+                                           ((0, 2), (4, 0), 4),
+                                           ((2, 0), (2, 4), 4),
+                                           ((1, 3), (3, 0), 4)):
+            self.assertEqual(field.get_distance(cell, other_cell), distance)
+
+    def test_get_cell_id(self):
+        field = Field(3)
+
+        for number, cell in enumerate(field.get_all_cells()):
+            self.assertEqual(field.get_cell_id(cell), number)
+            self.assertIn(cell, field)
+
+        for cell in ((-1, 0), (0, -1), (0, 3), (2, 5), (4, 3), (5, 0)):
+            self.assertIsNone(field.get_cell_id(cell))
+            self.assertNotIn(cell, field)
+
+        self.assertListEqual(field.order_cells([(4, 2), (0, 1), (2, 0)]),
+                             [(0, 1), (2, 0), (4, 2)])
+
 
 class FieldStateTest(unittest.TestCase):
     def test_init_state(self):
@@ -133,6 +190,44 @@ class FieldStateTest(unittest.TestCase):
             self.assertTrue(generator.field_state._colored_cells[cell]
                             in generator.field_state.COLORS)
 
+    def test_neighbour_values(self):
+        generator = PuzzleGenerator(5, seed=3)
+        generator.generate_filled_field()
+        state = generator.field_state
+        state.track_neighbour_values()
+        rand = random.Random(3)
+
+        for step in range(200):
+            if step == 100:
+                state.clear_state()
+            cell = rand.choice(state.field.get_all_cells())
+            state.set_state(cell, rand.randint(0, 5))
+
+            for checked_cell in state.field.get_all_cells():
+                self.assertSetEqual(
+                    set(state.get_neighbour_values(checked_cell)),
+                    {state.get_state(n) for n in
+                     state.field.get_neighbour_cells(checked_cell)})
+
+    def test_empty_and_filled_cells(self):
+        state = FieldState(Field(4))
+        cells = state.field.get_all_cells()
+        empty_cells = state.get_empty_cells()
+        filled_cells = state.get_filled_cells()
+        rand = random.Random(4)
+
+        for step in range(100):
+            if step == 50:
+                state.clear_state()
+            state.set_state(rand.choice(cells), rand.randint(0, 3))
+
+            self.assertSetEqual(
+                set(empty_cells),
+                {cell for cell in cells if state.get_state(cell) == 0})
+            self.assertSetEqual(
+                set(filled_cells),
+                {cell for cell in cells if state.get_state(cell) != 0})
+
     def test_get_involved(self):
         string = '''
           3 5 1
@@ -150,6 +245,141 @@ class FieldStateTest(unittest.TestCase):
             self.assertListEqual(field_state.get_involved(cell), involved)
 
 
+class BitboardFieldStateTest(unittest.TestCase):
+    def test_same_as_field_state(self):
+        rand = random.Random(5)
+        field = Field(6)
+        state = FieldState(field)
+        bitboard = BitboardFieldState(field)
+
+        for step in range(300):
+            if step == 150:
+                state.clear_state()
+                bitboard.clear_state()
+            cell = rand.choice(field.get_all_cells())
+            value = rand.choice((0, 0, 1, 2, 3))
+            state.set_state(cell, value)
+            bitboard.set_state(cell, value)
+
+            if step % 30:
+                continue
+            for cell in field.get_all_cells():
+                involved = bitboard.get_involved(cell)
+                self.assertEqual(involved[0], cell)
+                self.assertCountEqual(involved, state.get_involved(cell))
+                self.assertSetEqual(set(bitboard.get_neighbour_values(cell)),
+                                    set(state.get_neighbour_values(cell)))
+                value = state.get_state(cell)
+                if 0 < len(involved) < value:
+                    self.assertCountEqual(
+                        bitboard.get_expansion(involved, value),
+                        state.get_expansion(involved, value))
+                for value in range(4):
+                    self.assertEqual(
+                        bitboard.neighbours_differ(cell, involved, value),
+                        state.neighbours_differ(cell, involved, value))
+        self.assertEqual(bitboard.pack(), state.pack())
+
+    def test_solve(self):
+        generator = PuzzleGenerator(5, seed=4)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 40)
+        string = str(generator.game_field)
+
+        for solver_class in (PuzzleSolver, LargePuzzleSolver):
+            solver = solver_class(string)
+            solver.solve()
+            bitboard_solver = type('BitboardSolver', (solver_class,), {
+                'STATE_CLASS': BitboardFieldState})(string)
+            bitboard_solver.solve()
+
+            self.assertIsInstance(bitboard_solver.field_state,
+                                  BitboardFieldState)
+            self.assertEqual(str(bitboard_solver.field_state),
+                             str(solver.field_state))
+            bitboard_solver.field_state.check_solution()
+
+
+class VerifierTest(unittest.TestCase):
+    SOLUTION = '''
+          3 3 3
+         5 5 5 5
+        3 4 4 5 1
+         3 1 4 4
+          3 2 2
+        '''
+
+    def test_check_solution(self):
+        FieldState.from_string_to_state(self.SOLUTION).check_solution()
+
+        for cell, value, message in (
+                ((2, 4), 0, 'Empty cell (2, 4)'),
+                ((4, 2), 3, 'Group (4, 1) of value 2 has 1 cells'),
+                ((2, 4), 5, 'Group (1, 0) of value 5 has 6 cells')):
+            state = FieldState.from_string_to_state(self.SOLUTION)
+            state.set_state(cell, value)
+            with self.assertRaises(ValueError) as error:
+                state.check_solution()
+            self.assertEqual(str(error.exception), message)
+
+    def test_verify_solution(self):
+        self.assertIsNone(verify_solution(self.SOLUTION))
+        self.assertIsNone(verify_solution(self.SOLUTION, self.SOLUTION))
+        self.assertEqual(verify_solution('1 1'), 'Wrong format of field state')
+        self.assertEqual(
+            verify_solution(self.SOLUTION, self.SOLUTION.replace('3', '5', 1)),
+            'Clue (0, 0) changed from 5 to 3')
+        self.assertEqual(verify_solution(self.SOLUTION, '0 0\n0 0 0\n0 0'),
+                         'Solution size differs from puzzle size')
+
+        generator = PuzzleGenerator(6)
+        generator.generate_filled_field()
+        self.assertIsNone(verify_solution(str(generator.field_state)))
+
+    def test_iter_boards(self):
+        lines = ['\n', '  1 2\n', ' 3 4 5\n', '  6 7\n', '\n', '\n',
+                 '  8 9\n', ' 1 2 3\n', '  4 5']
+        self.assertListEqual(list(iter_boards(lines)),
+                             ['  1 2\n 3 4 5\n  6 7\n',
+                              '  8 9\n 1 2 3\n  4 5'])
+
+    def test_verify_solutions(self):
+        broken = self.SOLUTION.replace('4 5 1', '4 5 0')
+        boards = [self.SOLUTION, broken] * 5
+
+        results = list(verify_solutions(iter(boards), 2, 1))
+        self.assertListEqual(results[:2], [None, 'Empty cell (2, 4)'])
+        self.assertListEqual(results, results[:2] * 5)
+
+
+class CellsGroupTest(unittest.TestCase):
+    def test_add_cells(self):
+        group = CellsGroup(5, [(0, 0), (0, 1)])
+        self.assertEqual(group.get_possible_length(), 2)
+
+        for cell in ((1, 0), (1, 1), (1, 0)):
+            group.add_possible_cell(cell)
+        for cell in ((2, 2), (2, 2)):
+            group.add_connection(cell)
+
+        self.assertListEqual(group.possible_cells, [(1, 0), (1, 1)])
+        self.assertListEqual(group.possible_connection_cells, [(2, 2)])
+        self.assertEqual(group.get_possible_length(), 5)
+        for cell in ((0, 1), (1, 1), (2, 2)):
+            self.assertIn(cell, group)
+        self.assertNotIn((3, 3), group)
+
+    def test_set_initial_cells(self):
+        group = CellsGroup(3, [(0, 0)])
+        group.add_possible_cell((0, 1))
+        group.initial_cells = [(0, 0), (1, 0)]
+
+        self.assertIn((1, 0), group)
+        self.assertEqual(group.get_possible_length(), 3)
+        with self.assertRaises(AttributeError):
+            group.cells = []
+
+
 class PuzzleGeneratorTest(unittest.TestCase):
     def test_generate_filled_field(self):
         generator = PuzzleGenerator(3)
@@ -228,6 +458,109 @@ class PuzzleGeneratorTest(unittest.TestCase):
                 generator.field_state.get_full_state().items()):
             self.assertTrue(generator.game_field.get_state(cell) == 1)
 
+    def test_generator_stats(self):
+        generator = PuzzleGenerator(5, seed=6)
+        generator.generate_filled_field()
+        stats = generator.stats
+
+        self.assertEqual(stats.fields[5], 1)
+        self.assertLessEqual(sum(stats.choices.values()),
+                             sum(stats.attempts.values()))
+        for key, attempts in stats.attempts.items():
+            self.assertLessEqual(stats.failures[key], attempts)
+        self.assertTrue(stats.report().startswith(
+            'Size 5: 1 fields, {} restarts'.format(stats.restarts[5])))
+
+        merged = GeneratorStats().merge(stats).merge(stats)
+        self.assertEqual(merged.fields[5], 2)
+
+    def test_adaptive_values(self):
+        with self.assertRaises(ValueError):
+            PuzzleGenerator(5, tolerance=-1)
+        for adaptive in (False, True):
+            with self.assertRaises(ValueError):
+                PuzzleGenerator(5, 1, adaptive=adaptive)
+
+        generator = PuzzleGenerator(6, seed=7, adaptive=True, tolerance=0.05)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False)
+        check_solution(self, generator.game_field, generator.field_state)
+
+        weights = generator._value_weights(range(2, 10))
+        self.assertAlmostEqual(sum(weights), 1)
+        for weight in weights:
+            self.assertLessEqual(abs(weight - 1 / 8), 0.05 + 1e-9)
+        self.assertNotEqual(max(weights), min(weights))
+
+
+class ThreadPoolTest(unittest.TestCase):
+    def test_generator_seed(self):
+        random.seed(1)
+        global_state = random.getstate()
+
+        generators = [PuzzleGenerator(5, seed=2) for _ in range(2)]
+        for generator in generators:
+            generator.generate_filled_field()
+            generator.generate_field_for_game(False)
+
+        self.assertEqual(str(generators[0].game_field),
+                         str(generators[1].game_field))
+        self.assertEqual(random.getstate(), global_state)
+
+    def test_generate_many(self):
+        generators = generate_many(8, 5, 30, seed=3, workers=4)
+        self.assertEqual(len(generators), 8)
+        for generator in generators:
+            check_solution(self, generator.game_field, generator.field_state)
+
+        self.assertListEqual(
+            [str(g.game_field) for g in generators],
+            [str(g.game_field) for g in generate_many(8, 5, 30, seed=3,
+                                                      workers=1)])
+
+        adaptive = [str(g.game_field) for g in generate_many(
+            4, 5, 30, seed=3, workers=1, adaptive=True)]
+        self.assertListEqual(adaptive, [
+            str(g.game_field) for g in generate_many(
+                4, 5, 30, seed=3, workers=4, adaptive=True)])
+
+    def test_solve_many(self):
+        generators = generate_many(8, 6, 20, big=True, seed=4)
+        puzzles = [str(g.game_field) for g in generators]
+
+        for backend in ('simple', 'large', 'exact'):
+            results = solve_many(puzzles, backend=backend, workers=4)
+            for generator, result in zip(generators, results):
+                self.assertEqual(result.backend, backend)
+                check_solution(
+                    self, generator.game_field,
+                    FieldState.from_string_to_state(result.solution))
+
+
+class LargePuzzleGeneratorTest(unittest.TestCase):
+    def test_generate_filled_field(self):
+        generator = LargePuzzleGenerator(12)
+        generator.generate_filled_field()
+        check_solution(self, generator.field_state, generator.field_state)
+
+        groups_cells = set()
+        for group in generator.groups:
+            self.assertEqual(len(group.initial_cells), group.get_value())
+            groups_cells.update(group.initial_cells)
+        self.assertSetEqual(groups_cells,
+                            set(generator.field.get_all_cells()))
+
+    def test_generate_field_for_game(self):
+        generator = LargePuzzleGenerator(8, 5)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 30)
+
+        for cell in generator.field.get_all_cells():
+            self.assertLessEqual(generator.field_state.get_state(cell), 5)
+            if generator.game_field.get_state(cell) != 0:
+                self.assertEqual(generator.game_field.get_state(cell),
+                                 generator.field_state.get_state(cell))
+
 
 class PuzzleSolverTest(unittest.TestCase):
     def test_error_from_string_to_state(self):
@@ -283,6 +616,23 @@ class PuzzleSolverTest(unittest.TestCase):
                              ((2, 1), {3, 4, 5}), ((3, 0), {3, 5})):
             self.assertSetEqual(set(solver.possible_values[cell]), values)
 
+    def test_find_possible_values_distance(self):
+        generator = PuzzleGenerator(6)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 50)
+
+        solver = PuzzleSolver(str(generator.game_field), False, True)
+        solver._refresh_state()
+        field = solver.field_state.field
+
+        for group in set(solver.unfilled_groups.values()):
+            free_length = group.get_value() - len(group.initial_cells)
+            for cell in group.possible_cells:
+                self.assertLessEqual(
+                    min(field.get_distance(cell, c)
+                        for c in group.initial_cells), free_length)
+                self.assertIn(group.get_value(), solver.possible_values[cell])
+
     def test_find_additional_values(self):
         string = '''
           3 3 0
@@ -300,6 +650,36 @@ class PuzzleSolverTest(unittest.TestCase):
                              ((4, 0), {3, 5})):
             self.assertSetEqual(set(solver.possible_values[cell]), values)
 
+    def test_find_additional_values_with_max_value(self):
+        string = '''
+          0 0 0
+         0 0 0 0
+        0 0 0 0 0
+         0 0 0 0
+          0 0 0
+        '''
+
+        for max_value, values in ((None, set(range(2, 10))),
+                                  (12, set(range(2, 13))),
+                                  (30, set(range(2, 20)))):
+            solver = PuzzleSolver(string, False, False, max_value)
+            solver._refresh_state()
+            self.assertSetEqual(set(solver.possible_values[(2, 2)]), values)
+
+        string = '''
+          0 0 0
+         0 0 0 0
+        0 0 0 0 0
+         0 0 0 0
+          0 0 12
+        '''
+
+        solver = PuzzleSolver(string)
+        self.assertEqual(solver.max_value, 12)
+        solver._refresh_state()
+        self.assertSetEqual(set(solver.possible_values[(0, 0)]),
+                            set(range(2, 13)))
+
     def test_solve(self):
         string = '''
           0 0 0
@@ -346,6 +726,44 @@ class PuzzleSolverTest(unittest.TestCase):
         for cell in solver.field_state.field.get_all_cells():
             self.assertNotEqual(solver.field_state.get_state(cell), 0)
 
+    def test_probe_values(self):
+        generator = PuzzleGenerator(5, seed=7)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 45)
+        string = str(generator.game_field)
+
+        solver = PuzzleSolver(string, probe_budget=0)
+        solver.solve()
+        self.assertEqual(solver.probes, 0)
+        nodes = solver.nodes
+
+        solver = PuzzleSolver(string)
+        solver.solve()
+        check_solution(self, generator.game_field, solver.field_state)
+        self.assertGreater(solver.pruned_values, 0)
+        self.assertLessEqual(solver.probes, solver.PROBE_BUDGET)
+        self.assertLess(solver.nodes, nodes)
+
+        result = solve_with_backend('simple', string, probe_budget=2)
+        self.assertIsNotNone(result.solution)
+
+    def test_value_consistent(self):
+        string = '''
+          3 0 0
+         5 5 5 5
+        6 6 0 6 1
+         0 1 4 4
+          6 4 4
+        '''
+
+        solver = PuzzleSolver(string)
+        solver._refresh_state()
+        state = dict(solver.field_state.get_full_state())
+        self.assertFalse(solver._value_consistent((2, 2), 6))
+        self.assertDictEqual(dict(solver.field_state.get_full_state()), state)
+        self.assertIsNone(solver.field_state._changes)
+        self.assertEqual(solver.probes, 1)
+
     def test_check_group_size(self):
         string = '''
           3 0 5
@@ -404,6 +822,911 @@ class PuzzleSolverTest(unittest.TestCase):
         for value in solver.field_state.get_full_state().values():
             self.assertNotEqual(value, 0)
 
+    def test_find_infeasibility(self):
+        for string, reason in (
+                ('''
+                  4 6 6
+                 5 6 6 0
+                4 4 6 8 8
+                 0 8 0 0
+                  8 8 8
+                 ''', 'group (0, 0) of value 4 has no room to grow'),
+                ('''
+                  1 7 7
+                 4 7 7 7
+                4 4 7 7 1
+                 0 2 5 5
+                  5 5 5
+                 ''', 'groups (1, 0) and (3, 1) both have to grow '
+                      'through (3, 0)'),
+                ('''
+                  1 3 3
+                 4 4 3 1
+                4 0 4 2 2
+                 6 6 1 6
+                  6 6 6
+                 ''', 'cell (2, 1) has no possible values'),
+                ('''
+                  7 7 7
+                 7 7 7 7
+                1 0 0 0 1
+                 3 4 4 4
+                  3 3 4
+                 ''', 'empty region (2, 1) of 3 cells cannot be split '
+                      'into groups of values [2]')):
+            for solver_class in (PuzzleSolver, LargePuzzleSolver):
+                solver = solver_class(string)
+                solver._refresh_state()
+                self.assertEqual(solver._find_infeasibility(), reason)
+
+                solver = solver_class(string)
+                with self.assertRaises(ValueError) as error:
+                    solver.solve()
+                self.assertTrue(str(error.exception).startswith(
+                    'Puzzle is unsolvable: '))
+                self.assertEqual(solver.nodes, 0)
+
+        for seed in range(10):
+            generator = PuzzleGenerator(5, seed=seed)
+            generator.generate_filled_field()
+            generator.generate_field_for_game(False, 30)
+            solver = LargePuzzleSolver(str(generator.game_field))
+            solver._refresh_state()
+            solver._propagate()
+            self.assertIsNone(solver._find_infeasibility())
+
+
+class LargePuzzleSolverTest(unittest.TestCase):
+    def test_solve(self):
+        string = '''
+          3 0 0
+         5 0 5 5
+        3 0 4 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        solver = LargePuzzleSolver(string)
+        solver.solve()
+
+        for cell, value in (((0, 1), 3), ((0, 2), 3), ((1, 1), 5),
+                            ((2, 1), 4), ((3, 0), 3)):
+            self.assertEqual(solver.field_state.get_state(cell), value)
+
+    def test_solve_and_try_fill_empty_cells(self):
+        string = '''
+          3 0 0
+         5 0 0 5
+        3 0 0 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        solver = LargePuzzleSolver(string, True)
+        solver.solve()
+        check_solution(self, FieldState.from_string_to_state(string),
+                       solver.field_state)
+
+    def test_refresh_state(self):
+        generator = LargePuzzleGenerator(6, seed=1)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False)
+        string = str(generator.game_field)
+
+        for strict in (False, True):
+            solver = LargePuzzleSolver(string, False, strict)
+            solver._refresh_state()
+            empty_cells = list(filter(
+                lambda c: solver.field_state.get_state(c) == 0,
+                solver.field_state.field.get_all_cells()))
+
+            for cell in empty_cells[::3]:
+                solver.field_state.set_state(
+                    cell, generator.field_state.get_state(cell))
+                try:
+                    solver._refresh_state()
+                except ValueError:
+                    pass
+
+                fresh_solver = LargePuzzleSolver(
+                    str(solver.field_state), False, strict)
+                try:
+                    fresh_solver._refresh_state()
+                except ValueError:
+                    pass
+
+                for empty_cell in empty_cells:
+                    self.assertListEqual(
+                        solver.possible_values.get(empty_cell, []),
+                        fresh_solver.possible_values.get(empty_cell, []))
+
+    def test_propagation_queue(self):
+        generator = LargePuzzleGenerator(10, seed=3)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 40)
+
+        solver = LargePuzzleSolver(str(generator.game_field))
+        solver._refresh_state()
+        self.assertTrue(solver._queue)
+        for entry in solver._queue:
+            deduction = solver._deduction(entry[-1])
+            self.assertEqual(entry[0], solver.RULE_PRIORITY[deduction.rule])
+        self.assertEqual(solver._queue[0][0],
+                         min(entry[0] for entry in solver._queue))
+
+        solver._propagate()
+        self.assertFalse(solver._queue)
+        for cell in solver.field_state.field.get_all_cells():
+            if solver.field_state.get_state(cell) == 0:
+                self.assertGreater(len(solver.possible_values[cell]), 1)
+
+    def test_unsolvable_puzzle(self):
+        string = '''
+          3 0 0
+         5 5 5 5
+        6 6 0 6 1
+         0 1 4 4
+          6 4 4
+        '''
+        solver = LargePuzzleSolver(string)
+
+        with self.assertRaises(ValueError):
+            solver.solve()
+
+    def test_solve_with_max_value(self):
+        generator = LargePuzzleGenerator(10, 20, 0)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 20)
+
+        solver = LargePuzzleSolver(str(generator.game_field), False, False, 20)
+        solver.solve()
+        check_solution(self, generator.game_field, solver.field_state)
+
+    def test_solve_big_field(self):
+        start = time.monotonic()
+
+        generator = LargePuzzleGenerator(100, seed=0)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 20)
+
+        solver = LargePuzzleSolver(str(generator.game_field))
+        solver.solve()
+
+        self.assertLess(time.monotonic() - start, 60)
+        check_solution(self, generator.game_field, solver.field_state)
+
+
+class HintSessionTest(unittest.TestCase):
+    def test_next_hint(self):
+        string = '''
+          3 0 0
+         5 0 5 5
+        3 0 4 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        session = HintSession(string)
+        hint = session.next_hint()
+        self.assertEqual(hint.rule, 'join_groups_if_one_connection')
+        self.assertListEqual(hint.cells, [(1, 1)])
+        self.assertEqual(hint.value, 5)
+        self.assertEqual(session.next_hint(), hint)
+
+        rules = set()
+        while hint is not None:
+            rules.add(hint.rule)
+            session.apply_hint(hint)
+            hint = session.next_hint()
+
+        self.assertSetEqual(rules, {'join_groups_if_one_connection',
+                                    'fill_group_if_no_other_variants'})
+        for cell, value in (((0, 1), 3), ((0, 2), 3), ((1, 1), 5),
+                            ((2, 1), 4), ((3, 0), 3)):
+            self.assertEqual(session.field_state.get_state(cell), value)
+
+    def test_set_cell(self):
+        string = '''
+          3 0 0
+         5 0 0 5
+        3 0 0 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        session = HintSession(string, True)
+        hint = session.next_hint()
+        self.assertListEqual(hint.cells, [(3, 0)])
+
+        session.set_cell((3, 0), 3)
+        self.assertNotEqual(session.next_hint(), hint)
+
+        with self.assertRaises(ValueError):
+            session.set_cell((2, 1), 1)
+        self.assertFalse(session.is_consistent())
+
+        session.set_cell((2, 1), 0)
+        session.set_cell((3, 0), 0)
+        self.assertTrue(session.is_consistent())
+        self.assertEqual(session.next_hint(), hint)
+
+        with self.assertRaises(ValueError):
+            session.set_cell((99, 99), 3)
+        self.assertNotIn((99, 99), session.field_state.get_full_state())
+        self.assertTrue(session.is_consistent())
+        self.assertEqual(session.next_hint(), hint)
+
+    def test_hint_area(self):
+        generator = LargePuzzleGenerator(30, seed=0)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 20)
+
+        session = HintSession(str(generator.game_field))
+        hint = session.next_hint()
+        while hint is not None:
+            session.apply_hint(hint)
+            hint = session.next_hint()
+
+        cell = next(c for c in generator.field.get_all_cells()
+                    if session.field_state.get_state(c) == 0)
+        session.set_cell(cell, generator.field_state.get_state(cell))
+        self.assertLess(len(session._queue), 200)
+
+
+class UniquenessSessionTest(unittest.TestCase):
+    def _has_other_solution(self, puzzle, solution, cell):
+        for value in range(2, 10):
+            if value == solution.get_state(cell):
+                continue
+            puzzle.set_state(cell, value)
+            try:
+                LargePuzzleSolver(str(puzzle)).solve()
+                return True
+            except ValueError:
+                pass
+            finally:
+                puzzle.set_state(cell, 0)
+        return False
+
+    def test_remove_clues(self):
+        generator = PuzzleGenerator(5, seed=11)
+        generator.generate_filled_field()
+        solution = generator.field_state
+        solver = LargePuzzleSolver(str(solution))
+        solver.solve()
+        session = UniquenessSession(solver)
+        self.assertIsNot(session.field_state, solver.field_state)
+        self.assertIs(session.field_state.field, solver.field_state.field)
+        solver_state = dict(solver.field_state.get_full_state())
+        cells = list(solution.field.get_all_cells())
+        random.Random(1).shuffle(cells)
+
+        for cell in cells[:30]:
+            puzzle = session.puzzle()
+            puzzle.set_state(cell, 0)
+            unique = (solution.get_state(cell) != 1
+                      and not self._has_other_solution(puzzle, solution, cell))
+
+            self.assertEqual(session.remove_clues([cell]), unique)
+            self.assertEqual(cell not in session.clues, unique)
+            if session.alternative is not None:
+                session.alternative.check_solution()
+                self.assertNotEqual(session.alternative.get_state(cell),
+                                    solution.get_state(cell))
+                for clue in session.clues - {cell}:
+                    self.assertEqual(session.alternative.get_state(clue),
+                                     solution.get_state(clue))
+
+        self.assertDictEqual(dict(solver.field_state.get_full_state()),
+                             solver_state)
+        self.assertFalse(solver.field_state.get_empty_cells())
+        self.assertFalse(solver.unfilled_groups)
+        self.assertFalse(solver._excluded_values)
+
+    def test_add_clues(self):
+        generator = PuzzleGenerator(4, seed=5)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 30)
+        clues = [c for c in generator.field.get_all_cells()
+                 if generator.game_field.get_state(c) != 0]
+
+        session = UniquenessSession(
+            HintSession(str(generator.field_state)), clues)
+        self.assertDictEqual(session.puzzle().get_full_state(),
+                             generator.game_field.get_full_state())
+
+        empty_cells = [c for c in generator.field.get_all_cells()
+                       if c not in session.clues]
+        session.add_clues(empty_cells[:1])
+        self.assertEqual(len(session.clues), len(clues) + 1)
+        self.assertEqual(session.puzzle().get_state(empty_cells[0]),
+                         generator.field_state.get_state(empty_cells[0]))
+
+        cell = empty_cells[1]
+        value = generator.field_state.get_state(cell)
+        for wrong_clues in ([(9, 9)], {(0, 0): 0}, {cell: value + 1}):
+            with self.assertRaises(ValueError):
+                session.add_clues(wrong_clues)
+        session.add_clues({cell: value})
+        self.assertEqual(len(session.clues), len(clues) + 2)
+
+    def test_wrong_solution(self):
+        with self.assertRaises(ValueError):
+            UniquenessSession(HintSession('''
+              3 0 0
+             5 0 5 5
+            3 0 4 5 1
+             0 1 4 4
+              3 2 2
+            '''))
+
+        with self.assertRaises(TypeError):
+            UniquenessSession(PuzzleSolver('1 1\n1 1 1\n1 1'))
+
+
+class PuzzleStoreTest(unittest.TestCase):
+    def test_pack(self):
+        generator = PuzzleGenerator(5, seed=2)
+        generator.generate_filled_field()
+        big_state = FieldState(Field(3))
+        big_state.set_state((2, 2), 300)
+
+        for state in (generator.field_state, big_state,
+                      FieldState.from_string_to_state(VerifierTest.SOLUTION)):
+            self.assertDictEqual(
+                FieldState.unpack(state.pack()).get_full_state(),
+                state.get_full_state())
+
+    def test_canonical_hash(self):
+        generator = PuzzleGenerator(5, seed=4)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 40)
+        puzzle = generator.game_field
+        field = puzzle.field
+        symmetries = field.get_symmetries()
+        self.assertEqual(len(set(symmetries)), 12)
+
+        for symmetry in symmetries:
+            mapping = dict(zip(symmetries[0], symmetry))
+            for cell in field.get_all_cells():
+                self.assertSetEqual(
+                    {mapping[n] for n in field.get_neighbour_cells(cell)},
+                    set(field.get_neighbour_cells(mapping[cell])))
+
+            moved = FieldState(field)
+            for cell in field.get_all_cells():
+                moved.set_state(mapping[cell], puzzle.get_state(cell))
+            self.assertEqual(moved.canonical_hash(), puzzle.canonical_hash())
+
+        puzzle.set_state(field.get_all_cells()[0], 0)
+        self.assertNotEqual(generator.game_field.canonical_hash(),
+                            generator.field_state.canonical_hash())
+
+    def test_store(self):
+        generators = generate_many(6, 4, 30, seed=1)
+        generators.extend(generate_many(3, 5, 50, seed=2))
+
+        with PuzzleStore(':memory:') as store:
+            store.BATCH_SIZE = 4
+            self.assertEqual(store.add_many(
+                (g.game_field, g.field_state) for g in generators), 9)
+            puzzle_id = store.add(generators[0].game_field, unity=True,
+                                  cost=10)
+            self.assertEqual(len(store), 10)
+
+            records = store.query(size=4, unity=False)
+            self.assertFalse(isinstance(records, list))
+            records = list(records)
+            self.assertEqual(len(records), 6)
+            for record, generator in zip(records, generators):
+                self.assertDictEqual(record.puzzle.get_full_state(),
+                                     generator.game_field.get_full_state())
+                self.assertDictEqual(record.solution.get_full_state(),
+                                     generator.field_state.get_full_state())
+                self.assertEqual(record.max_value, 9)
+                self.assertLessEqual(record.empty, 30)
+
+            self.assertEqual(
+                len(list(store.query(size=5, min_empty=40, max_empty=60))), 3)
+            self.assertEqual(len(list(store.query(limit=2))), 2)
+            self.assertEqual(
+                [r.id for r in store.query(
+                    puzzle_hash=generators[0].game_field.canonical_hash())],
+                [1, puzzle_id])
+
+            record, = store.query(max_cost=10)
+            self.assertEqual(record.id, puzzle_id)
+            self.assertIsNone(record.solution)
+            store.update(puzzle_id, generators[0].field_state, 5, True)
+            record, = store.query(unique=True)
+            self.assertEqual((record.id, record.cost), (puzzle_id, 5))
+            self.assertDictEqual(record.solution.get_full_state(),
+                                 generators[0].field_state.get_full_state())
+
+            store.update(1, generators[1].field_state, 7)
+            record = next(iter(store.query(size=4)))
+            self.assertEqual((record.id, record.cost), (1, 7))
+            self.assertDictEqual(record.solution.get_full_state(),
+                                 generators[0].field_state.get_full_state())
+
+    def test_is_unique(self):
+        for seed, unique in ((0, False), (1, True)):
+            generator = PuzzleGenerator(4, seed=seed)
+            generator.generate_filled_field()
+            generator.generate_field_for_game(True, 25)
+            self.assertEqual(is_unique(generator.game_field,
+                                       generator.field_state, True), unique)
+        self.assertIsNone(is_unique(generator.game_field,
+                                    generator.field_state, True, budget=0))
+
+        generator = LargePuzzleGenerator(20, seed=1)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 50)
+        self.assertIsNone(is_unique(generator.game_field,
+                                    generator.field_state))
+
+
+class KernelsTest(unittest.TestCase):
+    def _kernels(self, kernel):
+        kernels = [_python_kernel(kernel)]
+        if KERNELS_COMPILED:
+            kernels.append(kernel)
+        return kernels
+
+    def _boards(self):
+        for seed in range(4):
+            generator = PuzzleGenerator(6, seed=seed)
+            generator.generate_filled_field()
+            generator.generate_field_for_game(False, 20 * seed)
+            yield generator.game_field
+            yield generator.field_state
+
+    def _buffers(self, state):
+        values = [state.get_state(c) for c in state.field.get_all_cells()]
+        return (values, state.field.get_neighbour_table(),
+                [0] * len(values), [0] * len(values), [0] * len(values))
+
+    def test_involved(self):
+        for state in self._boards():
+            cells = state.field.get_all_cells()
+            values, neighbours, seen, stack, result = self._buffers(state)
+            python_state = copy.deepcopy(state)
+            python_state._values = None
+
+            for kernel in self._kernels(_involved_kernel):
+                for number, cell in enumerate(cells):
+                    expected = python_state.get_involved(cell)
+                    count = kernel(values, neighbours, number, seen, stack,
+                                   result)
+                    self.assertListEqual(
+                        [cells[n] for n in result[:count]], expected)
+                    self.assertListEqual(state.get_involved(cell), expected)
+                    self.assertFalse(any(seen))
+
+    def test_check_groups(self):
+        for state in self._boards():
+            values, neighbours, seen, stack, result = self._buffers(state)
+            python_state = copy.deepcopy(state)
+            python_state._values = None
+            cells = state.field.get_all_cells()
+
+            expected = (-1, 0)
+            for number, cell in enumerate(cells):
+                group = python_state.get_involved(cell)
+                if values[number] == 0:
+                    expected = (number, 0)
+                    break
+                if len(group) != values[number]:
+                    expected = (number, len(group))
+                    break
+
+            for kernel in self._kernels(_check_groups_kernel):
+                self.assertEqual(tuple(kernel(values, neighbours, seen, stack,
+                                              result)), expected)
+                self.assertFalse(any(seen))
+
+    def test_expansion(self):
+        for state in self._boards():
+            values, neighbours, seen, stack, result = self._buffers(state)
+            index = state.field.get_cell_index()
+            cells = state.field.get_all_cells()
+            python_state = copy.deepcopy(state)
+            python_state._values = None
+
+            for cell in sorted(state.get_filled_cells()):
+                group = state.get_involved(cell)
+                value = state.get_state(cell)
+                if len(group) >= value:
+                    continue
+
+                expected = python_state.get_expansion(group, value)
+                self.assertListEqual(state.get_expansion(group, value),
+                                     expected)
+                for kernel in self._kernels(_expansion_kernel):
+                    for number, group_cell in enumerate(group):
+                        result[number] = index[group_cell]
+                    count = kernel(values, neighbours, len(group), value,
+                                   seen, stack, result)
+                    self.assertListEqual(
+                        [(cells[n // 8], n % 8)
+                         for n in result[len(group):count]], expected)
+                    self.assertFalse(any(seen))
+
+
+class SearchTraceTest(unittest.TestCase):
+    def test_read(self):
+        trace_file = io.BytesIO()
+        trace = SearchTrace(trace_file)
+        trace.record(SearchTrace.DECISION, (2, 3), 4, 1)
+        trace.record(SearchTrace.CONFLICT, (2, 3), 4, 1)
+        trace.record(SearchTrace.BACKTRACK, (1, 0), 0, 1)
+        trace.record(SearchTrace.DECISION, (150, 1), 9, 70000)
+
+        trace_file.seek(0)
+        events = list(SearchTrace.read(trace_file))
+        self.assertListEqual([e[:4] for e in events],
+                             [(SearchTrace.DECISION, (2, 3), 4, 1),
+                              (SearchTrace.CONFLICT, (2, 3), 4, 1),
+                              (SearchTrace.BACKTRACK, (1, 0), 0, 1),
+                              (SearchTrace.DECISION, (150, 1), 9, 70000)])
+        self.assertLessEqual(events[0].time, events[-1].time)
+        self.assertEqual(len(trace_file.getvalue()),
+                         len(SearchTrace.MAGIC) + 4 * SearchTrace.RECORD.size)
+
+        with self.assertRaises(ValueError):
+            list(SearchTrace.read(io.BytesIO(b'FILL')))
+
+    def test_summarize(self):
+        events = [(SearchTrace.DECISION, (0, 0), 2, 1, 0.0),
+                  (SearchTrace.PROPAGATED, (0, 0), 2, 1, 1.0),
+                  (SearchTrace.DECISION, (0, 1), 3, 2, 1.5),
+                  (SearchTrace.CONFLICT, (0, 1), 3, 2, 2.5),
+                  (SearchTrace.DECISION, (0, 1), 4, 2, 3.0),
+                  (SearchTrace.CONFLICT, (0, 1), 4, 2, 4.0),
+                  (SearchTrace.BACKTRACK, (0, 0), 0, 1, 4.0)]
+        summary = SearchTrace.summarize([TraceEvent(*e) for e in events])
+
+        self.assertEqual(summary.events['decision'], 3)
+        self.assertEqual(summary.events['conflict'], 2)
+        self.assertEqual(summary.max_depth, 2)
+        self.assertDictEqual(dict(summary.nodes_per_depth), {1: 1, 2: 2})
+        self.assertDictEqual(dict(summary.conflicts_per_cell), {(0, 1): 2})
+        self.assertDictEqual(summary.time_per_depth, {1: 1.5, 2: 2.5})
+        self.assertEqual(summary.total_time, 4.0)
+
+    def test_solve_with_trace(self):
+        string = '''
+          3 0 0
+         5 0 0 5
+        3 0 0 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        for name in ('simple', 'large'):
+            trace_file = io.BytesIO()
+            result = solve_with_backend(name, string, True,
+                                        trace=SearchTrace(trace_file))
+            trace_file.seek(0)
+            summary = SearchTrace.summarize(SearchTrace.read(trace_file))
+
+            self.assertEqual(summary.events['decision'], result.nodes)
+            self.assertEqual(summary.events['solved'], 1)
+            self.assertEqual(summary.events['decision'],
+                             summary.events['propagated']
+                             + summary.events['conflict'])
+
+
+class ExactCoverSolverTest(unittest.TestCase):
+    def test_solve(self):
+        string = '''
+          3 0 0
+         5 0 5 5
+        3 0 4 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        solver = ExactCoverSolver(string)
+        solver.solve()
+
+        for cell, value in (((0, 1), 3), ((0, 2), 3), ((1, 1), 5),
+                            ((2, 1), 4), ((3, 0), 3)):
+            self.assertEqual(solver.field_state.get_state(cell), value)
+
+    def test_solve_with_unities(self):
+        string = '''
+          3 0 0
+         5 0 0 5
+        3 0 0 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        solver = ExactCoverSolver(string, True)
+        solver.solve()
+        check_solution(self, FieldState.from_string_to_state(string),
+                       solver.field_state)
+
+    def test_find_placements_strict(self):
+        string = '''
+          0 0 0
+         4 4 4 0
+        6 6 0 6 1
+         0 1 4 4
+          6 4 4
+        '''
+
+        for strict in (False, True):
+            solver = ExactCoverSolver(string, False, strict)
+            placements = solver._find_placements()
+            self.assertEqual(
+                strict, all(any(solver.field_state.get_state(c)
+                                for c in placement)
+                            for value, placement in placements
+                            if value > 1))
+
+    def test_grown_placements(self):
+        field = Field(4)
+        cells = field.get_all_cells()
+        solver = ExactCoverSolver(str(FieldState(field)))
+
+        for value in range(1, 5):
+            placements = set()
+            for root in cells:
+                for placement in solver._grown_placements(root, value, cells):
+                    self.assertEqual(min(placement), root)
+                    placements.add(frozenset(placement))
+
+            self.assertEqual(
+                len(placements),
+                sum(len(solver._grown_placements(r, value, cells))
+                    for r in cells))
+            for placement in placements:
+                state = FieldState(field)
+                for cell in placement:
+                    state.set_state(cell, 1)
+                self.assertEqual(len(state.get_involved(next(iter(
+                    placement)))), value)
+
+        shapes = solver._shape_tree(5)
+        self.assertIs(ExactCoverSolver(str(FieldState(field)))
+                      ._shape_tree(3), shapes)
+        self.assertListEqual([list(shapes[2]).count(level)
+                              for level in range(1, 6)], [1, 3, 11, 44, 186])
+
+        rng = random.Random(3)
+        for value in range(2, 6):
+            allowed = {c for c in cells if rng.random() < 0.8}
+            for root in allowed:
+                self.assertListEqual(
+                    solver._grown_placements(root, value, allowed),
+                    solver._grown_area_placements(root, value, allowed))
+
+    def test_shapes_cache_limit(self):
+        field = Field(4)
+        cells = field.get_all_cells()
+        solver = ExactCoverSolver(str(FieldState(field)))
+        cache = dict(ExactCoverSolver._shapes_cache)
+        ExactCoverSolver._shapes_cache.clear()
+        solver.SHAPES_CACHE_BYTES = 16 * 10
+        try:
+            self.assertIsNotNone(solver._shape_tree(2))
+            self.assertIsNone(solver._shape_tree(3))
+            self.assertIsNone(solver._shape_tree(4))
+            self.assertIsNotNone(solver._shape_tree(2))
+            self.assertListEqual(
+                solver._grown_placements(cells[0], 3, set(cells)),
+                solver._grown_area_placements(cells[0], 3, set(cells)))
+        finally:
+            ExactCoverSolver._shapes_cache.clear()
+            ExactCoverSolver._shapes_cache.update(cache)
+
+    def test_unsolvable_puzzle(self):
+        string = '''
+          3 0 0
+         5 5 5 5
+        6 6 0 6 1
+         0 1 4 4
+          6 4 4
+        '''
+        solver = ExactCoverSolver(string)
+
+        with self.assertRaises(ValueError):
+            solver.solve()
+
+    def test_solve_generated(self):
+        for seed in range(4):
+            generator = PuzzleGenerator(5, seed=seed)
+            generator.generate_filled_field()
+            generator.generate_field_for_game(False, 60)
+
+            solver = ExactCoverSolver(str(generator.game_field))
+            solver.solve()
+            check_solution(self, generator.game_field, solver.field_state)
+
+
+class SolverBackendsTest(unittest.TestCase):
+    PUZZLE = '''
+          3 0 0
+         5 0 5 5
+        3 0 4 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+    UNSOLVABLE_PUZZLE = '''
+          3 0 0
+         5 5 5 5
+        6 6 0 6 1
+         0 1 4 4
+          6 4 4
+        '''
+
+    def test_solve_with_backend(self):
+        for name in ('simple', 'large', 'bitboard', 'exact'):
+            result = solve_with_backend(name, self.PUZZLE)
+            self.assertEqual(result.backend, name)
+            self.assertIsNone(result.error)
+            check_solution(self, FieldState.from_string_to_state(self.PUZZLE),
+                           FieldState.from_string_to_state(result.solution))
+
+        result = solve_with_backend('large', self.UNSOLVABLE_PUZZLE)
+        self.assertIsNone(result.solution)
+        self.assertEqual(result.error, 'Puzzle is unsolvable: group (1, 0) '
+                                       'of value 5 has no room to grow')
+        self.assertFalse(result.out_of_budget)
+
+        with self.assertRaises(ValueError):
+            solve_with_backend('unknown', self.PUZZLE)
+
+    def test_budget(self):
+        generator = PuzzleGenerator(5, seed=7)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 45)
+        string = str(generator.game_field)
+
+        for name in ('simple', 'large', 'bitboard', 'exact'):
+            result = solve_with_backend(name, string)
+            self.assertGreater(result.nodes, 0)
+
+            result = solve_with_backend(name, string, False, False,
+                                        result.nodes - 1)
+            self.assertIsNone(result.solution)
+            self.assertTrue(result.out_of_budget)
+
+    def test_register_backend(self):
+        register_backend('test', solver_backend(LargePuzzleSolver))
+        try:
+            result = solve_with_backend('test', self.PUZZLE)
+            self.assertEqual(result.backend, 'test')
+            self.assertIsNotNone(result.solution)
+        finally:
+            del SOLVER_BACKENDS['test']
+
+    def test_race_backends(self):
+        result = race_backends(self.PUZZLE, ['large', 'exact'])
+        self.assertIn(result.backend, ('large', 'exact'))
+        check_solution(self, FieldState.from_string_to_state(self.PUZZLE),
+                       FieldState.from_string_to_state(result.solution))
+
+        result = race_backends('0 0', ['large'])
+        self.assertIsNone(result.solution)
+
+        register_backend('broken', lambda *args: 1 / 0)
+        try:
+            result = race_backends(self.PUZZLE, ['broken', 'large'])
+            self.assertEqual(result.backend, 'large')
+            self.assertIsNotNone(result.solution)
+        finally:
+            del SOLVER_BACKENDS['broken']
+
+        register_backend('slow', lambda *args: time.sleep(30))
+        try:
+            start = time.perf_counter()
+            result = race_backends(self.UNSOLVABLE_PUZZLE, ['slow', 'large'])
+            self.assertLess(time.perf_counter() - start, 10)
+            self.assertEqual(result.backend, 'large')
+            self.assertIsNone(result.solution)
+            self.assertFalse(result.out_of_budget)
+        finally:
+            del SOLVER_BACKENDS['slow']
+
+    def test_compare_backends(self):
+        results = compare_backends([self.PUZZLE, self.UNSOLVABLE_PUZZLE],
+                                   ['large', 'exact'])
+
+        self.assertListEqual(list(results), ['large', 'exact'])
+        for name in results:
+            self.assertEqual(len(results[name]), 2)
+            self.assertIsNone(results[name][1].solution)
+        self.assertEqual(results['large'][0].solution,
+                         results['exact'][0].solution)
+        for result, other_result in zip(results['large'], results['exact']):
+            self.assertTrue(results_agree(self.PUZZLE, result, other_result))
+
+    def test_results_agree(self):
+        generator = PuzzleGenerator(5, seed=7)
+        generator.generate_filled_field()
+        generator.generate_field_for_game(False, 60)
+        puzzle = str(generator.game_field)
+        solution = str(generator.field_state)
+        other = solve_with_backend('large', puzzle)
+        solved = other._replace(solution=solution)
+        unsolved = other._replace(solution=None, error='unsolvable')
+
+        self.assertTrue(results_agree(puzzle, other, solved))
+        self.assertTrue(results_agree(puzzle, unsolved, unsolved))
+        self.assertFalse(results_agree(puzzle, other, unsolved))
+        self.assertFalse(results_agree(
+            puzzle, other, other._replace(out_of_budget=True)))
+        self.assertFalse(results_agree(self.PUZZLE, other, solved))
+
+
+class MemoryProfilerTest(unittest.TestCase):
+    def test_phase(self):
+        profiler = MemoryProfiler(3)
+
+        with profiler.phase('allocate'):
+            data = [[i] for i in range(10000)]
+        with profiler.phase('release'):
+            temporary = [[i] for i in range(10000)]
+            del temporary
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertListEqual([p.name for p in profiler.phases],
+                             ['allocate', 'release'])
+
+        allocate, release = profiler.phases
+        self.assertGreater(allocate.retained, 100000)
+        self.assertGreaterEqual(allocate.peak, allocate.retained)
+        self.assertLessEqual(len(allocate.top_allocations), 3)
+        self.assertTrue(allocate.top_allocations[0].location.startswith(
+            os.path.abspath(__file__)))
+        self.assertLess(release.retained, 100000)
+        self.assertGreater(release.peak, 100000)
+        self.assertEqual(len(data), 10000)
+
+    def test_memory_phase(self):
+        with memory_phase(None, 'none'):
+            self.assertFalse(tracemalloc.is_tracing())
+
+        profiler = MemoryProfiler()
+        with memory_phase(profiler, 'outer'):
+            with memory_phase(profiler, 'inner'):
+                self.assertTrue(tracemalloc.is_tracing())
+            self.assertTrue(tracemalloc.is_tracing())
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertListEqual([p.name for p in profiler.phases],
+                             ['inner', 'outer'])
+
+        profiler = MemoryProfiler()
+        with profiler.phase('outer'):
+            temporary = [[i] for i in range(10000)]
+            del temporary
+            with profiler.phase('inner'):
+                pass
+        inner, outer = profiler.phases
+        self.assertLess(inner.peak, 100000)
+        self.assertGreater(outer.peak, 100000)
+
+    def test_profile_solving(self):
+        string = '''
+          3 0 0
+         5 0 0 5
+        3 0 0 5 1
+         0 1 4 4
+          3 2 2
+        '''
+
+        for name in ('simple', 'large', 'exact'):
+            profiler = MemoryProfiler()
+            result = solve_with_backend(name, string, True, profiler=profiler)
+            self.assertIsNotNone(result.solution)
+            self.assertListEqual([p.name for p in profiler.phases],
+                                 ['propagate', 'search'])
+            self.assertIn('propagate: peak', profiler.report())
+
 
 if __name__ == '__main__':
     unittest.main()